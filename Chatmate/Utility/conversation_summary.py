@@ -0,0 +1,86 @@
+import threading
+from django.conf import settings
+from django.db import connection
+from Chatmate.Utility.groq_response import generate_response_with_llama
+
+SUMMARY_PROMPT = (
+    "Update the running summary of a conversation between a user and an assistant. "
+    "Keep facts, decisions, names and open questions, and drop pleasantries. "
+    "Answer with the updated summary only.\n\n"
+    "Current Summary: {summary}\n\n"
+    "New Turns:\n{turns}\n\n"
+    "Updated Summary:"
+)
+
+_running = set()
+_running_lock = threading.Lock()
+
+def unsummarized_turns(room, limit=None):
+    """
+    Returns the turns of a room that are not folded into its summary yet, oldest first.
+    With a limit, only the latest limit of them are returned.
+    """
+    from Chatmate.models import Query
+    turns = Query.objects.filter(room=room.name).order_by('created_at', 'id')
+    start = room.summary_turns if limit is None else max(room.summary_turns, turns.count() - limit)
+    return list(turns[start:])
+
+def pending_turns(room):
+    """
+    Returns how many turns older than the last few are not folded into the room's summary yet.
+    """
+    from Chatmate.models import Query
+    return Query.objects.filter(room=room.name).count() - settings.SUMMARY_RECENT_TURNS - room.summary_turns
+
+def summarize_room(room_name):
+    """
+    Folds up to SUMMARY_EVERY_TURNS of the turns older than the last few into the room's rolling summary,
+    oldest first, so each summary prompt stays bounded. Returns whether the summary was updated.
+    """
+    from Chatmate.models import Query, Rooms
+    room = Rooms.objects.get(name=room_name)
+    turns = Query.objects.filter(room=room_name).order_by('created_at', 'id')
+    cutoff = min(turns.count() - settings.SUMMARY_RECENT_TURNS, room.summary_turns + settings.SUMMARY_EVERY_TURNS)
+    new_turns = list(turns[room.summary_turns:cutoff]) if cutoff > room.summary_turns else []
+    if not new_turns:
+        return False
+
+    prompt = SUMMARY_PROMPT.format(
+        summary=room.summary or "None",
+        turns="\n\n".join(turn.history_text() for turn in new_turns),
+    )
+    summary = generate_response_with_llama(prompt, raise_errors=True)
+
+    # Another worker may have advanced the summary meanwhile, in which case this one is dropped
+    return Rooms.objects.filter(pk=room.pk, summary_turns=room.summary_turns).update(
+        summary=summary.strip(),
+        summary_turns=cutoff,
+    ) > 0
+
+def _summarize_in_background(room_name):
+    from Chatmate.models import Rooms
+    try:
+        # A backlog of turns is folded in bounded passes until fewer than SUMMARY_EVERY_TURNS remain
+        while summarize_room(room_name):
+            if pending_turns(Rooms.objects.get(name=room_name)) < settings.SUMMARY_EVERY_TURNS:
+                break
+    except Exception as e:
+        print(f"Error summarizing room {room_name}: {str(e)}")
+    finally:
+        with _running_lock:
+            _running.discard(room_name)
+        connection.close()
+
+def schedule_summary_update(room):
+    """
+    Starts a background summary update once SUMMARY_EVERY_TURNS turns have piled up beyond the recent ones.
+    """
+    if not settings.SUMMARY_ENABLED:
+        return
+    if pending_turns(room) < settings.SUMMARY_EVERY_TURNS:
+        return
+    with _running_lock:
+        if room.name in _running:
+            return
+        _running.add(room.name)
+    threading.Thread(target=_summarize_in_background, args=(room.name,), daemon=True).start()
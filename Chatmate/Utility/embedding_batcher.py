@@ -0,0 +1,132 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+import numpy as np
+from django.conf import settings
+
+class EmbeddingBatcher:
+    """
+    Collects encode requests arriving within a short window, or up to a maximum batch size,
+    encodes them as one batch and hands each caller back its own rows. Its stats are logged
+    at most every log_seconds while batches are flowing.
+    """
+    def __init__(self, encode, max_batch_size, max_wait_ms, name='embedding', log_seconds=None):
+        self._encode = encode
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+        self.log_seconds = settings.EMBEDDING_BATCH_LOG_SECONDS if log_seconds is None else log_seconds
+        self._last_log = time.monotonic()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+        self.total_wait_seconds = 0.0
+
+    def _ensure_worker(self):
+        # Threads do not survive a fork, so each worker process starts its own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                threading.Thread(target=self._run, args=(self._queue,), name='embedding-batcher', daemon=True).start()
+                self._pid = os.getpid()
+
+    def encode(self, texts):
+        """
+        Encodes texts as part of the next batch and returns their embeddings.
+        """
+        texts = list(texts)
+        if not texts:
+            return self._encode(texts)
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((texts, future, time.monotonic()))
+        return future.result()
+
+    def _collect(self, requests):
+        batch = [requests.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request[0])
+        return batch
+
+    def _run(self, requests):
+        while True:
+            batch = self._collect(requests)
+            started = time.monotonic()
+            try:
+                embeddings = np.asarray(self._encode([text for texts, _, _ in batch for text in texts]))
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            offset = 0
+            for texts, future, _ in batch:
+                future.set_result(embeddings[offset:offset + len(texts)])
+                offset += len(texts)
+
+            with self._lock:
+                self.batches += 1
+                self.items += offset
+                self.largest_batch = max(self.largest_batch, offset)
+                self.total_wait_seconds += sum(started - submitted for _, _, submitted in batch)
+            self._log_stats()
+
+    def _log_stats(self):
+        if not self.log_seconds or time.monotonic() - self._last_log < self.log_seconds:
+            return
+        self._last_log = time.monotonic()
+        metrics = ", ".join(
+            f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}"
+            for key, value in self.stats().items()
+        )
+        print(f"{self.name.capitalize()} batcher stats in process {os.getpid()}: {metrics}")
+
+    def stats(self):
+        """
+        Returns batch size and queueing delay metrics.
+        """
+        with self._lock:
+            return {
+                'batches': self.batches,
+                'items': self.items,
+                'largest_batch': self.largest_batch,
+                'average_batch_size': self.items / self.batches if self.batches else 0,
+                'average_wait_ms': 1000 * self.total_wait_seconds / self.items if self.items else 0,
+            }
+
+_query_batcher = None
+_query_batcher_lock = threading.Lock()
+
+def get_query_batcher():
+    """
+    Returns the process-wide batcher used for query embeddings.
+    """
+    global _query_batcher
+    if _query_batcher is None:
+        with _query_batcher_lock:
+            if _query_batcher is None:
+                from Chatmate.Utility.indexing_documents import encode_texts
+                _query_batcher = EmbeddingBatcher(
+                    encode_texts,
+                    settings.EMBEDDING_BATCH_MAX_SIZE,
+                    settings.EMBEDDING_BATCH_MAX_WAIT_MS,
+                    name='query',
+                )
+    return _query_batcher
@@ -0,0 +1,199 @@
+import json
+import time
+import base64
+import socket
+import threading
+import http.client
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+import numpy as np
+from django.conf import settings
+
+UNIX_SCHEME = 'unix'
+ENCODE_PATH = '/encode'
+HEALTH_PATH = '/health'
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """
+    HTTP connection over a Unix domain socket.
+    """
+    def __init__(self, socket_path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+def _encode_matrix(matrix):
+    matrix = np.ascontiguousarray(matrix, dtype='float32')
+    return {'shape': list(matrix.shape), 'data': base64.b64encode(matrix.tobytes()).decode('ascii')}
+
+def _decode_matrix(payload):
+    return np.frombuffer(base64.b64decode(payload['data']), dtype='float32').reshape(payload['shape'])
+
+class EmbeddingServiceClient:
+    """
+    Thin client for the local embedding service, keeping one keep-alive connection per thread.
+    Large encodes are split into requests of at most max_batch texts, which get bulk_timeout each.
+    After a failed call the service is skipped for a cooldown period so callers fall back quickly.
+    """
+    def __init__(self, url, timeout, retry_seconds, max_batch=None, bulk_timeout=None):
+        self.url = urlparse(url)
+        self.timeout = timeout
+        self.retry_seconds = retry_seconds
+        self.max_batch = max_batch or 0
+        self.bulk_timeout = bulk_timeout or timeout
+        self._local = threading.local()
+        self._unavailable_until = 0
+
+    def available(self):
+        return time.monotonic() >= self._unavailable_until
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            if self.url.scheme == UNIX_SCHEME:
+                connection = UnixHTTPConnection(self.url.path, timeout=self.timeout)
+            else:
+                connection = http.client.HTTPConnection(self.url.hostname, self.url.port or 80, timeout=self.timeout)
+            self._local.connection = connection
+        return connection
+
+    def _reset(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+        self._local.connection = None
+
+    def _request(self, texts, model_name, timeout):
+        connection = self._connection()
+        connection.timeout = timeout
+        if connection.sock is not None:
+            connection.sock.settimeout(timeout)
+        body = json.dumps({'texts': texts})
+        connection.request('POST', ENCODE_PATH, body=body, headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        payload = json.loads(response.read())
+        if response.status != 200:
+            raise ValueError(payload.get('error', f"status {response.status}"))
+        if payload.get('model') != model_name:
+            raise ValueError(f"Service runs model {payload.get('model')}, expected {model_name}")
+        return _decode_matrix(payload)
+
+    def encode(self, texts, model_name):
+        """
+        Encodes texts through the service. Returns None when the service cannot be used.
+        """
+        if not self.available():
+            return None
+        try:
+            texts = list(texts)
+            step = self.max_batch or len(texts) or 1
+            if len(texts) <= step:
+                return self._request(texts, model_name, self.timeout)
+            return np.concatenate([
+                self._request(texts[start:start + step], model_name, self.bulk_timeout)
+                for start in range(0, len(texts), step)
+            ])
+        except Exception as e:
+            print(f"Embedding service unavailable, encoding in process: {str(e)}")
+            self._reset()
+            self._unavailable_until = time.monotonic() + self.retry_seconds
+            return None
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_embedding_service_client():
+    """
+    Returns the shared service client, or None when no embedding service is configured.
+    """
+    global _client
+    if not settings.EMBEDDING_SERVICE_URL:
+        return None
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = EmbeddingServiceClient(
+                    settings.EMBEDDING_SERVICE_URL,
+                    settings.EMBEDDING_SERVICE_TIMEOUT,
+                    settings.EMBEDDING_SERVICE_RETRY_SECONDS,
+                    max_batch=settings.EMBEDDING_SERVICE_MAX_BATCH,
+                    bulk_timeout=settings.EMBEDDING_SERVICE_BULK_TIMEOUT,
+                )
+    return _client
+
+_service_batcher = None
+
+def get_service_batcher():
+    """
+    Returns the batcher that groups encode requests from all web workers inside the service.
+    """
+    global _service_batcher
+    if _service_batcher is None:
+        with _client_lock:
+            if _service_batcher is None:
+                from Chatmate.Utility.embedding_batcher import EmbeddingBatcher
+                from Chatmate.Utility.indexing_documents import encode_locally
+                _service_batcher = EmbeddingBatcher(
+                    encode_locally,
+                    settings.EMBEDDING_BATCH_MAX_SIZE,
+                    settings.EMBEDDING_BATCH_MAX_WAIT_MS,
+                    name='service',
+                )
+    return _service_batcher
+
+class EmbeddingRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves encode requests with the model owned by the service process.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        from Chatmate.Utility.indexing_documents import embedding_model_id
+        if self.path != HEALTH_PATH:
+            return self._send_json(404, {'error': 'Not found'})
+        self._send_json(200, {'status': 'ok', 'model': embedding_model_id(), 'batching': get_service_batcher().stats()})
+
+    def do_POST(self):
+        from Chatmate.Utility.indexing_documents import embedding_model_id
+        if self.path != ENCODE_PATH:
+            return self._send_json(404, {'error': 'Not found'})
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            texts = json.loads(self.rfile.read(length))['texts']
+            embeddings = get_service_batcher().encode(texts)
+            self._send_json(200, {'model': embedding_model_id(), **_encode_matrix(embeddings)})
+        except Exception as e:
+            self._send_json(400, {'error': str(e)})
+
+    def address_string(self):
+        # Unix socket peers have no host address
+        return self.client_address[0] if self.client_address else UNIX_SCHEME
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ('', 0)
+
+def create_embedding_server(url):
+    """
+    Creates the HTTP server for a localhost URL or a unix:///path/to.sock URL.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme == UNIX_SCHEME:
+        return ThreadingUnixHTTPServer(parsed.path, EmbeddingRequestHandler)
+    return ThreadingHTTPServer((parsed.hostname or '127.0.0.1', parsed.port or 80), EmbeddingRequestHandler)
@@ -1,5 +1,17 @@
 import random
+import hashlib
 
 def generate_random_id():
     """Generates a random ID for DocumentChunk."""
-    return random.randint(100000, 999999)
\ No newline at end of file
+    return random.randint(100000, 999999)
+
+def content_hash(text):
+    """Returns the SHA-256 hex digest of a text."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def file_content_hash(file):
+    """Returns the SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    for block in file.chunks():
+        digest.update(block)
+    return digest.hexdigest()
\ No newline at end of file
@@ -1,21 +1,17 @@
 import os
-from groq import Groq
+from Chatmate.Utility.llm_clients import get_llm_client
 
-def generate_response_with_llama(query, model=None):
+def generate_response_with_llama(query, model=None, raise_errors=False):
     """
-    Generate a response using the specified Groq model.
+    Generate a response using the specified Groq model. With raise_errors set, failures
+    are raised instead of being returned as an error message.
     """
     try:
-        # Fetch the API key and model from an environment variable for security purposes
+        # Fetch the model from an environment variable; the API key is read once by the shared client
         model = model or os.getenv('GROQ_MODEL')
-        api_key = os.getenv('GROQ_API_KEY')
-        print("api_key", api_key)
 
-        if not api_key:
-            raise ValueError("API key is missing. Please set the GROQ_API_KEY environment variable.")
-
-        # Initialize the Groq client with the API key
-        client = Groq(api_key=api_key)
+        # Reuse the pooled Groq client so each turn skips the connection setup
+        client = get_llm_client('groq')
 
         # Create a chat completion request
         chat_completion = client.chat.completions.create(
@@ -34,10 +30,14 @@ def generate_response_with_llama(query, model=None):
     except ValueError as ve:
         # Handle missing API key or other value-related issues
         print(f"ValueError: {ve}")
+        if raise_errors:
+            raise
         return "There was an issue with your request."
 
     except Exception as e:
         # Handle general exceptions and log the error
         print(f"An error occurred: {e}")
+        if raise_errors:
+            raise
         return "An error occurred while processing your request."
 
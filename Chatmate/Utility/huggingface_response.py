@@ -1,11 +1,10 @@
 import os
 import time
-import requests
+import httpx
+from Chatmate.Utility.llm_clients import get_llm_client
 
-# Fetch the API URL and Authorization token from environment variables
+# Fetch the API URL from environment variables; the token and timeouts are set on the shared client
 API_URL = os.getenv("HUGGINGFACE_API_URL")
-API_TOKEN = os.getenv("HUGGINGFACE_API_TOKEN")
-headers = {"Authorization": f"Bearer {API_TOKEN}"}
 
 def query_huggingface_api(payload, retries=3, delay=20):
     """
@@ -13,7 +12,7 @@ def query_huggingface_api(payload, retries=3, delay=20):
     """
     for attempt in range(retries):
         try:
-            response = requests.post(API_URL, headers=headers, json=payload)
+            response = get_llm_client('huggingface').post(API_URL, json=payload)
             
             # Handle model loading (503)
             if response.status_code == 503:
@@ -25,7 +24,7 @@ def query_huggingface_api(payload, retries=3, delay=20):
             response.raise_for_status()
             return response.json()
 
-        except requests.exceptions.HTTPError as http_err:
+        except httpx.HTTPStatusError as http_err:
             if response.status_code == 401:
                 print("Authorization error: The token might be invalid or expired.")
                 print("Please check your Hugging Face API token.")
@@ -34,7 +33,7 @@ def query_huggingface_api(payload, retries=3, delay=20):
                 print(f"Response content: {response.text}")  # For debugging
             break
 
-        except requests.exceptions.RequestException as req_err:
+        except httpx.RequestError as req_err:
             print(f"Request error occurred: {req_err}")
             break
 
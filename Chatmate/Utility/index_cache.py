@@ -0,0 +1,78 @@
+import threading
+from collections import OrderedDict
+from django.conf import settings
+
+class RoomIndexCache:
+    """
+    Process-wide LRU cache of loaded room indexes, bounded by an approximate byte budget.
+    Each room keeps a single entry tagged with the index build it was loaded from.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, room_name, build):
+        """
+        Returns the cached value for the room at this index build, or None.
+        """
+        with self._lock:
+            entry = self._entries.get(room_name)
+            if entry is None or entry[0] != build:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(room_name)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, room_name, build, value, nbytes):
+        """
+        Caches a loaded room index, evicting the least recently used rooms to stay within budget.
+        """
+        with self._lock:
+            self._discard(room_name)
+            if nbytes > self.max_bytes:
+                return
+            while self._entries and self.current_bytes + nbytes > self.max_bytes:
+                _, (_, _, evicted_bytes) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_bytes
+                self.evictions += 1
+            self._entries[room_name] = (build, value, nbytes)
+            self.current_bytes += nbytes
+
+    def discard(self, room_name):
+        """
+        Drops the cached index of a room.
+        """
+        with self._lock:
+            self._discard(room_name)
+
+    def _discard(self, room_name):
+        entry = self._entries.pop(room_name, None)
+        if entry is not None:
+            self.current_bytes -= entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """
+        Returns the cache counters and current memory use.
+        """
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+room_index_cache = RoomIndexCache(settings.INDEX_CACHE_MAX_BYTES)
@@ -1,8 +1,15 @@
+import re
+import math
+import time
 import random
-from sentence_transformers import SentenceTransformer
+import threading
+from collections import deque
+import numpy as np
 import faiss
+from django.conf import settings
 
 from Chatmate.Utility.general_utility import generate_random_id
+from Chatmate.Utility.token_counting import count_tokens, split_by_tokens
 
 class Document:
     def __init__(self, id_, text):
@@ -16,33 +23,240 @@ class DocumentChunk:
         self.embedding = embedding
         self.text = text
 
-# Initialize the model with proper error handling
-try:
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-except Exception as e:
-    raise RuntimeError(f"Error initializing the model: {str(e)}")
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
 
-def chunk_text(text, chunk_size=100):
+# Low bits of a chunk ID hold the chunk position, the high bits the document ID
+CHUNK_POSITION_BITS = 20
+
+# Backends accepted by SentenceTransformer; the ONNX ones need sentence-transformers[onnx]
+EMBEDDING_BACKENDS = ('torch', 'onnx', 'onnx-int8')
+REFERENCE_EMBEDDING_BACKEND = 'torch'
+
+_models = {}
+_model_lock = threading.Lock()
+
+def embedding_model_id(backend=None):
+    """
+    Identifies the vectors of the model on a backend, e.g. 'all-MiniLM-L6-v2:onnx-int8'.
+    Backends agree only approximately, so vectors tagged with different IDs are never mixed.
+    """
+    return f"{EMBEDDING_MODEL_NAME}:{backend or settings.EMBEDDING_BACKEND}"
+
+def _backend_options(backend):
+    """
+    Returns the SentenceTransformer arguments for an embedding backend.
     """
-    Splits text into chunks of approximately chunk_size words.
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unsupported embedding backend: {backend}")
+    if backend == 'onnx':
+        return {'backend': 'onnx'}
+    if backend == 'onnx-int8':
+        # Dynamically int8-quantized export of the same model shipped in the model repository
+        return {'backend': 'onnx', 'model_kwargs': {'file_name': settings.EMBEDDING_ONNX_INT8_FILE}}
+    return {}
+
+def get_embedding_model(backend=None):
+    """
+    Returns the process-wide SentenceTransformer for a backend, loading it on first use.
+    Defaults to the EMBEDDING_BACKEND setting.
+    """
+    backend = backend or settings.EMBEDDING_BACKEND
+    model = _models.get(backend)
+    if model is None:
+        with _model_lock:
+            model = _models.get(backend)
+            if model is None:
+                try:
+                    from sentence_transformers import SentenceTransformer
+                    model = SentenceTransformer(EMBEDDING_MODEL_NAME, **_backend_options(backend))
+                    _models[backend] = model
+                except Exception as e:
+                    raise RuntimeError(f"Error initializing the model: {str(e)}")
+    return model
+
+def preload_embedding_model():
+    """
+    Loads the model ahead of the first request, e.g. in the gunicorn master before workers fork
+    so they share its memory pages copy-on-write.
+    """
+    get_embedding_model()
+
+def check_backend_parity(texts, backend=None, reference_backend=REFERENCE_EMBEDDING_BACKEND):
+    """
+    Encodes a sample corpus with a backend and the reference backend and reports their cosine agreement and timings.
+    """
+    backend = backend or settings.EMBEDDING_BACKEND
+    timings = {}
+    embeddings = {}
+    for name in (reference_backend, backend):
+        model = get_embedding_model(name)
+        model.encode(texts[:1])  # Warm up so the timings exclude lazy initialization
+        started = time.perf_counter()
+        embeddings[name] = np.asarray(model.encode(texts), dtype='float32')
+        timings[name] = time.perf_counter() - started
+
+    reference, candidate = embeddings[reference_backend], embeddings[backend]
+    cosine = np.sum(reference * candidate, axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    )
+    return {
+        'backend': backend,
+        'reference_backend': reference_backend,
+        'count': len(texts),
+        'mean_cosine': float(cosine.mean()),
+        'min_cosine': float(cosine.min()),
+        'reference_seconds': timings[reference_backend],
+        'backend_seconds': timings[backend],
+    }
+
+def make_chunk_id(document_id, position):
+    """
+    Derives a stable 64-bit chunk ID from a document ID and the chunk position within it.
+    """
+    if position >= 1 << CHUNK_POSITION_BITS:
+        raise ValueError(f"Chunk position {position} exceeds the supported chunks per document")
+    return (int(document_id) << CHUNK_POSITION_BITS) | position
+
+def chunk_document_id(chunk_id):
+    """
+    Returns the document ID encoded in a chunk ID.
+    """
+    return int(chunk_id) >> CHUNK_POSITION_BITS
+
+def chunk_position(chunk_id):
+    """
+    Returns the position within its document encoded in a chunk ID.
+    """
+    return int(chunk_id) & ((1 << CHUNK_POSITION_BITS) - 1)
+
+def encode_locally(texts):
+    """
+    Encodes texts with the in-process model.
+    """
+    return get_embedding_model().encode(texts)
+
+def encode_texts(texts):
+    """
+    Encodes texts through the shared embedding service when configured, falling back to the in-process model.
+    """
+    from Chatmate.Utility.embedding_service import get_embedding_service_client
+    client = get_embedding_service_client()
+    embeddings = client.encode(texts, embedding_model_id()) if client else None
+    return embeddings if embeddings is not None else encode_locally(texts)
+
+def encode_query(query):
+    """
+    Encodes a single query, batched with concurrent queries when micro-batching is enabled.
+    """
+    if not settings.EMBEDDING_BATCH_ENABLED:
+        return encode_texts([query])
+    from Chatmate.Utility.embedding_batcher import get_query_batcher
+    return get_query_batcher().encode([query])
+
+# Sentence ends and blank lines between paragraphs are the preferred chunk boundaries
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+|\n\s*\n')
+
+# A run of text this long without any boundary is cut anyway to keep memory bounded
+MAX_PENDING_CHARS = 20000
+
+def iter_tagged_sentences(pieces):
+    """
+    Yields (sentence, tag) pairs from a stream of (text, tag) pieces, holding only the unfinished sentence
+    in memory. Each sentence carries the tag of the piece it starts in, such as a page number.
+    """
+    pending, pending_tag = '', None
+    for piece, tag in pieces:
+        if not pending.strip():
+            pending_tag = tag
+        pending += piece
+        parts = SENTENCE_BOUNDARY.split(pending)
+        pending = parts.pop()
+        tags = [pending_tag] + [tag] * len(parts)
+        pending_tag = tags.pop()
+        # A piece can be many times MAX_PENDING_CHARS, so cut until the remainder fits
+        while len(pending) > MAX_PENDING_CHARS:
+            cut = pending.rfind(' ', 0, MAX_PENDING_CHARS)
+            cut = cut if cut > 0 else MAX_PENDING_CHARS
+            parts.append(pending[:cut])
+            tags.append(pending_tag)
+            pending, pending_tag = pending[cut:], tag
+        for part, part_tag in zip(parts, tags):
+            if part.strip():
+                yield part.strip(), part_tag
+    if pending.strip():
+        yield pending.strip(), pending_tag
+
+def iter_sentences(pieces):
+    """
+    Yields sentences and paragraphs from a stream of text pieces, holding only the unfinished one in memory.
+    """
+    for sentence, _ in iter_tagged_sentences((piece, None) for piece in pieces):
+        yield sentence
+
+def iter_tagged_chunks(pieces, max_tokens=None, overlap_tokens=None):
+    """
+    Lazily groups a stream of (text, tag) pieces into chunks of whole sentences of at most max_tokens
+    embedding-model tokens. Consecutive chunks share up to overlap_tokens tokens of trailing sentences.
+    Yields (chunk, first_tag, last_tag), the tags of the first and last sentence in the chunk.
+    """
+    max_tokens = max_tokens or settings.CHUNK_MAX_TOKENS
+    overlap_tokens = settings.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    tokenizer_name = settings.CHUNK_TOKENIZER
+
+    def emit():
+        return ' '.join(text for text, _, _ in window), window[0][2], window[-1][2]
+
+    window = deque()
+    window_tokens = 0
+    for sentence, tag in iter_tagged_sentences(pieces):
+        # Sentences longer than a chunk are cut into token-sized slices
+        tokens = count_tokens(sentence, tokenizer_name)
+        parts = [(sentence, tokens)] if tokens <= max_tokens else [
+            (part, count_tokens(part, tokenizer_name))
+            for part in split_by_tokens(sentence, max_tokens, tokenizer_name)
+        ]
+
+        for part, part_tokens in parts:
+            if window and window_tokens + part_tokens > max_tokens:
+                yield emit()
+                while window and (window_tokens > overlap_tokens or window_tokens + part_tokens > max_tokens):
+                    window_tokens -= window.popleft()[1]
+            window.append((part, part_tokens, tag))
+            window_tokens += part_tokens
+
+    if window:
+        yield emit()
+
+def iter_chunks(pieces, max_tokens=None, overlap_tokens=None):
+    """
+    Lazily groups a stream of text pieces into chunks of whole sentences of at most max_tokens
+    embedding-model tokens. Consecutive chunks share up to overlap_tokens tokens of trailing sentences.
+    """
+    tagged = ((piece, None) for piece in pieces)
+    for chunk, _, _ in iter_tagged_chunks(tagged, max_tokens, overlap_tokens):
+        yield chunk
+
+def chunk_text(text):
+    """
+    Splits text into sentence-aligned chunks sized in tokens.
     """
     try:
-        words = text.split()
-        return [' '.join(words[i:i + chunk_size]) for i in range(0, len(words), chunk_size)]
+        return list(iter_chunks([text]))
     except Exception as e:
         raise ValueError(f"Error chunking text: {str(e)}")
 
 def process_documents(documents):
     """
     Processes each document into chunks and returns a list of DocumentChunk objects.
+    A document's text may be a string or an iterable of text pieces, which is chunked lazily.
     """
     all_chunks = []
     try:
         for doc in documents:
             if "text" not in doc:
                 raise KeyError(f"Document is missing the 'text' key: {doc}")
-            chunks = chunk_text(doc["text"])
-            for i, chunk in enumerate(chunks):
+            pieces = [doc["text"]] if isinstance(doc["text"], str) else doc["text"]
+            for i, chunk in enumerate(iter_chunks(pieces)):
                 all_chunks.append(DocumentChunk(id_=generate_random_id(), chunk_id=i, text=chunk))
     except Exception as e:
         raise RuntimeError(f"Error processing documents: {str(e)}")
@@ -55,8 +269,7 @@ def process_texts(texts):
     all_chunks = []
     try:
         for i, text in enumerate(texts):
-            chunks = chunk_text(text)
-            for j, chunk in enumerate(chunks):
+            for j, chunk in enumerate(iter_chunks([text])):
                 all_chunks.append(DocumentChunk(id_=generate_random_id(), chunk_id=j, text=chunk))
     except Exception as e:
         raise RuntimeError(f"Error processing texts: {str(e)}")
@@ -68,7 +281,7 @@ def compute_embeddings(chunks):
     """
     try:
         texts = [chunk.text for chunk in chunks]
-        embeddings = model.encode(texts)
+        embeddings = encode_texts(texts)
         
         for chunk, embedding in zip(chunks, embeddings):
             chunk.embedding = embedding
@@ -76,30 +289,198 @@ def compute_embeddings(chunks):
         raise RuntimeError(f"Error computing embeddings: {str(e)}")
     return embeddings
 
-def create_index(embeddings):
+# Stored vector representations, from exact to most compact
+COMPRESSIONS = ('none', 'float16', 'sq8', 'pq')
+
+def _scalar_quantizer_type(compression):
+    if compression == 'float16':
+        return faiss.ScalarQuantizer.QT_fp16
+    return faiss.ScalarQuantizer.QT_8bit
+
+def _build_flat_index(embeddings, dimension, compression):
+    """
+    Exhaustive search, the cheapest choice for small rooms.
+    """
+    if compression == 'pq':
+        base_index = faiss.IndexPQ(dimension, settings.INDEX_PQ_M, settings.INDEX_PQ_NBITS)
+    elif compression != 'none':
+        base_index = faiss.IndexScalarQuantizer(dimension, _scalar_quantizer_type(compression))
+    else:
+        base_index = faiss.IndexFlatL2(dimension)
+    return faiss.IndexIDMap2(base_index)
+
+def _build_hnsw_index(embeddings, dimension, compression):
+    """
+    Graph-based approximate search for mid-size rooms. HNSW cannot remove vectors in place.
+    """
+    if compression == 'pq':
+        hnsw_index = faiss.IndexHNSWPQ(dimension, settings.INDEX_PQ_M, settings.INDEX_HNSW_M)
+    elif compression != 'none':
+        hnsw_index = faiss.IndexHNSWSQ(dimension, _scalar_quantizer_type(compression), settings.INDEX_HNSW_M)
+    else:
+        hnsw_index = faiss.IndexHNSWFlat(dimension, settings.INDEX_HNSW_M)
+    hnsw_index.hnsw.efConstruction = settings.INDEX_HNSW_EF_CONSTRUCTION
+    return faiss.IndexIDMap2(hnsw_index)
+
+def _build_ivf_index(embeddings, dimension, compression):
+    """
+    Inverted lists over trained centroids for very large rooms.
+    """
+    nlist = max(1, min(int(4 * math.sqrt(len(embeddings))), len(embeddings) // 39))
+    quantizer = faiss.IndexFlatL2(dimension)
+    if compression == 'pq':
+        return faiss.IndexIVFPQ(quantizer, dimension, nlist, settings.INDEX_PQ_M, settings.INDEX_PQ_NBITS)
+    if compression != 'none':
+        return faiss.IndexIVFScalarQuantizer(quantizer, dimension, nlist, _scalar_quantizer_type(compression))
+    return faiss.IndexIVFFlat(quantizer, dimension, nlist)
+
+INDEX_BUILDERS = {
+    'flat': _build_flat_index,
+    'hnsw': _build_hnsw_index,
+    'ivf': _build_ivf_index,
+}
+
+# Index types whose vectors can be removed by ID without rebuilding
+REMOVABLE_INDEX_TYPES = {'flat', 'ivf'}
+
+# Vectors removed from indexes of other types keep their graph rows under this ID until the next rebuild
+TOMBSTONE_ID = -1
+
+def tombstone_ids(index, ids):
+    """
+    Marks the vectors of the given IDs as removed in an ID-mapped index that cannot drop them in place.
+    Searches skip tombstoned rows through tombstone_search_params. Returns how many rows were tombstoned.
+    """
+    id_map = faiss.vector_to_array(index.id_map)
+    rows = np.isin(id_map, np.asarray(list(ids), dtype='int64'))
+    if rows.any():
+        id_map[rows] = TOMBSTONE_ID
+        faiss.copy_array_to_vector(id_map, index.id_map)
+        index.construct_rev_map()
+    return int(rows.sum())
+
+def tombstone_search_params():
+    """
+    Returns HNSW search parameters that only match live IDs, keeping the configured efSearch, with their selector.
+    Chunk IDs are never negative, so the selector keeps the whole non-negative range. The parameters only
+    hold a raw pointer to the selector, so callers keep both for the duration of the search.
+    """
+    selector = faiss.IDSelectorRange(0, np.iinfo('int64').max)
+    params = faiss.SearchParametersHNSW(sel=selector, efSearch=settings.INDEX_HNSW_EF_SEARCH)
+    return params, selector
+
+def select_index_type(count):
+    """
+    Chooses the index type for a corpus of the given size.
+    """
+    if count >= settings.INDEX_IVF_MIN_CHUNKS:
+        return 'ivf'
+    if count >= settings.INDEX_HNSW_MIN_CHUNKS:
+        return 'hnsw'
+    return 'flat'
+
+def select_compression(count):
+    """
+    Returns the configured compression for a corpus of the given size. Product quantization
+    needs enough vectors to train its codebooks, so smaller rooms use int8 scalar quantization.
+    """
+    compression = settings.INDEX_COMPRESSION
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unsupported index compression: {compression}")
+    if compression == 'pq' and count < settings.INDEX_PQ_MIN_CHUNKS:
+        return 'sq8'
+    return compression
+
+def needs_training(index_type, compression):
     """
-    Creates a FAISS index for the embeddings.
+    Checks whether an index of this type and compression learns parameters from the vectors it is built on.
+    """
+    return index_type == 'ivf' or compression in ('sq8', 'pq')
+
+def tune_index(index):
+    """
+    Applies the configured search-time recall/speed parameters to an index.
+    """
+    base_index = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else index
+    if isinstance(base_index, faiss.IndexHNSW):
+        base_index.hnsw.efSearch = settings.INDEX_HNSW_EF_SEARCH
+    elif isinstance(base_index, faiss.IndexIVF):
+        base_index.nprobe = settings.INDEX_IVF_NPROBE
+    return index
+
+def create_index(embeddings, ids=None, index_type=None, compression=None):
+    """
+    Creates an ID-addressable FAISS index for the embeddings. IDs default to the row positions and
+    the index type and compression are chosen by corpus size unless given.
     """
     try:
         if len(embeddings) == 0:
             raise ValueError("No embeddings to index.")
+        embeddings = np.ascontiguousarray(embeddings, dtype='float32')
         dimension = embeddings.shape[1]
-        index = faiss.IndexFlatL2(dimension)
-        index.add(embeddings)
+        index_type = index_type or select_index_type(len(embeddings))
+        compression = compression or select_compression(len(embeddings))
+        index = INDEX_BUILDERS[index_type](embeddings, dimension, compression)
+        if not index.is_trained:
+            index.train(embeddings)
+        ids = np.arange(len(embeddings)) if ids is None else ids
+        index.add_with_ids(embeddings, np.asarray(ids, dtype='int64'))
+        tune_index(index)
     except Exception as e:
         raise RuntimeError(f"Error creating FAISS index: {str(e)}")
     return index
 
-def retrieve_chunks(query, index, chunks, top_k=5):
+def index_nbytes(index):
     """
-    Retrieves the most relevant chunks based on the query.
+    Returns the serialized size of an index, which tracks its memory footprint.
+    """
+    return int(faiss.serialize_index(index).size)
+
+def evaluate_compression(embeddings, compression, k=10, query_count=200, index_type=None):
+    """
+    Builds a compressed index next to the exact one and reports the memory saved and the
+    recall@k of the compressed index, using a sample of the stored vectors as queries.
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+    exact_index = create_index(embeddings, index_type='flat', compression='none')
+    compressed_index = create_index(embeddings, index_type=index_type, compression=compression)
+
+    rows = np.random.default_rng(0).choice(len(embeddings), min(query_count, len(embeddings)), replace=False)
+    queries = embeddings[rows]
+    _, exact_ids = exact_index.search(queries, k)
+    _, compressed_ids = compressed_index.search(queries, k)
+
+    expected = min(k, len(embeddings))
+    recall = np.mean([
+        len((set(exact) & set(found)) - {-1}) / expected
+        for exact, found in zip(exact_ids, compressed_ids)
+    ])
+    exact_bytes, compressed_bytes = index_nbytes(exact_index), index_nbytes(compressed_index)
+    return {
+        'compression': compression,
+        'k': k,
+        'exact_bytes': exact_bytes,
+        'bytes': compressed_bytes,
+        'saved_bytes': exact_bytes - compressed_bytes,
+        'recall_at_k': float(recall),
+    }
+
+def search_chunks(query_embedding, index, chunks, top_k=5):
+    """
+    Retrieves the most relevant chunks for an already encoded query.
     """
     try:
-        query_embedding = model.encode([query])
-        distances, indices = index.search(query_embedding, top_k)
-        
-        # Retrieve the most relevant chunks based on indices
-        relevant_chunks = [chunks[i] for i in indices[0]]
+        distances, indices = index.search(np.asarray(query_embedding, dtype='float32'), top_k)
+
+        # Retrieve the most relevant chunks based on indices, FAISS pads missing hits with -1
+        relevant_chunks = [chunks[i] for i in indices[0] if i != -1]
+        distances = distances[:, :len(relevant_chunks)]
     except Exception as e:
         raise RuntimeError(f"Error retrieving chunks: {str(e)}")
     return relevant_chunks, distances
+
+def retrieve_chunks(query, index, chunks, top_k=5):
+    """
+    Retrieves the most relevant chunks based on the query.
+    """
+    return search_chunks(encode_query(query), index, chunks, top_k)
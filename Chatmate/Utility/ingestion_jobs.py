@@ -0,0 +1,182 @@
+import time
+import multiprocessing
+from datetime import timedelta
+from django.conf import settings
+from django.db import connections
+from django.db.models import F
+from django.utils import timezone
+
+from Chatmate.Utility.processing_documents import document_chunk_rooms, move_document_chunks, update_document_chunks
+
+# Running jobs are only requeued this long after their timeout, leaving their own worker time to fail them
+EXPIRY_GRACE_SECONDS = 60
+
+def enqueue_ingestion(document, room=None, kind=None):
+    """
+    Queues a document for parsing and indexing into a room, or for deletion with kind DELETE,
+    or runs the job right away when INGESTION_ASYNC is off. Returns the job.
+    """
+    from Chatmate.models import IngestionJob
+    job = IngestionJob.objects.create(
+        document=document,
+        room=room or document.room,
+        kind=kind or IngestionJob.INDEX,
+        timeout_seconds=settings.INGESTION_JOB_TIMEOUT,
+    )
+    if not settings.INGESTION_ASYNC:
+        claim_job(job.id)
+        run_job(job.id)
+        try:
+            job.refresh_from_db()
+        except IngestionJob.DoesNotExist:
+            # A finished delete job goes with its document
+            job.status = IngestionJob.SUCCEEDED
+    return job
+
+def pending_deletion_ids():
+    """
+    Returns a queryset of the IDs of documents whose deletion is queued or running.
+    """
+    from Chatmate.models import IngestionJob
+    return IngestionJob.objects.filter(
+        kind=IngestionJob.DELETE, status__in=[IngestionJob.QUEUED, IngestionJob.RUNNING]
+    ).values('document_id')
+
+def latest_ingestion_job(document):
+    """
+    Returns the most recent ingestion job of a document, or None if it has none.
+    """
+    return document.ingestion_jobs.order_by('-created_at', '-id').first()
+
+def claim_job(job_id):
+    """
+    Marks a queued job as running. Returns False if another worker claimed it first.
+    """
+    from Chatmate.models import IngestionJob
+    claimed = IngestionJob.objects.filter(id=job_id, status=IngestionJob.QUEUED).update(
+        status=IngestionJob.RUNNING,
+        started_at=timezone.now(),
+        attempts=F('attempts') + 1,
+    )
+    return claimed == 1
+
+def claim_next_job():
+    """
+    Claims the oldest queued job and returns its ID, or None when the queue is empty.
+    """
+    from Chatmate.models import IngestionJob
+    queued = IngestionJob.objects.filter(status=IngestionJob.QUEUED).order_by('created_at', 'id')
+    for job_id in queued.values_list('id', flat=True)[:10]:
+        if claim_job(job_id):
+            return job_id
+    return None
+
+def finish_job(job_id, error=None):
+    """
+    Marks a running job as succeeded, or as failed with the given error.
+    """
+    from Chatmate.models import IngestionJob
+    fields = {'finished_at': timezone.now()}
+    if error is None:
+        fields.update(status=IngestionJob.SUCCEEDED, stage='indexed', error='')
+    else:
+        fields.update(status=IngestionJob.FAILED, error=error)
+    IngestionJob.objects.filter(id=job_id, status=IngestionJob.RUNNING).update(**fields)
+
+def run_job(job_id):
+    """
+    Parses, chunks, embeds and indexes the document of a claimed job, recording each stage.
+    Delete jobs remove the document's chunks from the room index, then its file and row, and move
+    jobs carry its stored chunks over to the job's room. Chunks the document left behind in rooms
+    it was moved out of are dropped once the job's room is up to date.
+    """
+    from Chatmate.models import IngestionJob
+    try:
+        job = IngestionJob.objects.select_related('document').get(id=job_id)
+
+        def progress(stage):
+            IngestionJob.objects.filter(id=job_id).update(stage=stage)
+
+        if job.kind == IngestionJob.MOVE:
+            move_document_chunks(job.document, job.room_id, progress=progress)
+        else:
+            update_document_chunks(
+                document_ids=[job.document_id], room=job.room_id, delete=job.kind == IngestionJob.DELETE,
+                progress=progress, raise_errors=True
+            )
+            for previous_room in document_chunk_rooms(job.document_id, exclude=job.room_id):
+                update_document_chunks(document_ids=[job.document_id], room=previous_room, delete=True, raise_errors=True)
+        if job.kind == IngestionJob.DELETE:
+            document = job.document
+            if document.file:
+                document.file.delete()
+            # Deleting the document also deletes its jobs, this one included
+            document.delete()
+            return
+        finish_job(job_id)
+    except Exception as e:
+        print(f"Error running ingestion job {job_id}: {str(e)}")
+        finish_job(job_id, error=str(e))
+
+def _run_job_process(job_id):
+    try:
+        run_job(job_id)
+    finally:
+        connections.close_all()
+
+def requeue_expired_jobs(exclude_ids=()):
+    """
+    Returns running jobs past their timeout to the queue, e.g. after their worker was killed.
+    Jobs that already used all their attempts are failed instead.
+    """
+    from Chatmate.models import IngestionJob
+    now = timezone.now()
+    jobs = IngestionJob.objects.filter(status=IngestionJob.RUNNING, started_at__isnull=False).exclude(id__in=list(exclude_ids))
+    for job in jobs:
+        if job.started_at + timedelta(seconds=job.timeout_seconds + EXPIRY_GRACE_SECONDS) > now:
+            continue
+        if job.attempts >= settings.INGESTION_MAX_ATTEMPTS:
+            finish_job(job.id, error='Job timed out')
+        else:
+            IngestionJob.objects.filter(id=job.id, status=IngestionJob.RUNNING).update(
+                status=IngestionJob.QUEUED, stage='queued', started_at=None
+            )
+
+def run_worker(concurrency=None, poll_seconds=None, once=False):
+    """
+    Runs queued jobs, each in its own process, with at most concurrency jobs at a time.
+    A job running past its timeout is terminated and marked failed.
+    """
+    from Chatmate.models import IngestionJob
+    concurrency = concurrency or settings.INGESTION_WORKERS
+    poll_seconds = settings.INGESTION_POLL_SECONDS if poll_seconds is None else poll_seconds
+    context = multiprocessing.get_context('fork')
+    running = {}
+
+    while True:
+        for job_id, (process, deadline) in list(running.items()):
+            if not process.is_alive():
+                process.join()
+                del running[job_id]
+            elif time.monotonic() > deadline:
+                process.terminate()
+                process.join()
+                del running[job_id]
+                finish_job(job_id, error='Job timed out')
+                print(f"Ingestion job {job_id} timed out.")
+
+        requeue_expired_jobs(exclude_ids=running)
+        while len(running) < concurrency:
+            job_id = claim_next_job()
+            if job_id is None:
+                break
+            timeout_seconds = IngestionJob.objects.filter(id=job_id).values_list('timeout_seconds', flat=True).first()
+            # Children must open their own database connections
+            connections.close_all()
+            process = context.Process(target=_run_job_process, args=(job_id,))
+            process.start()
+            running[job_id] = (process, time.monotonic() + timeout_seconds)
+
+        if once and not running:
+            return
+        time.sleep(poll_seconds)
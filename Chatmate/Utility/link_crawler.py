@@ -0,0 +1,211 @@
+import queue
+import asyncio
+import threading
+from urllib.parse import urldefrag, urljoin, urlparse
+from urllib.robotparser import RobotFileParser
+from xml.etree import ElementTree
+import httpx
+from bs4 import BeautifulSoup
+from django.conf import settings
+
+from Chatmate.Utility.link_fetching import html_to_text
+
+SITEMAP_NAMESPACE = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+MAX_SITEMAPS = 20
+
+_DONE = object()
+
+def _same_site(url, host):
+    parsed = urlparse(url)
+    return parsed.scheme in ('http', 'https') and parsed.netloc == host
+
+def _normalize(url):
+    return urldefrag(url)[0]
+
+def _parse_sitemap(content):
+    """
+    Returns the page URLs and child sitemap URLs listed in a sitemap, or None if it is not one.
+    """
+    try:
+        root = ElementTree.fromstring(content)
+    except ElementTree.ParseError:
+        return None
+    locations = [loc.text.strip() for loc in root.iter(f'{SITEMAP_NAMESPACE}loc') if loc.text]
+    if root.tag == f'{SITEMAP_NAMESPACE}urlset':
+        return locations, []
+    if root.tag == f'{SITEMAP_NAMESPACE}sitemapindex':
+        return [], locations
+    return None
+
+class SiteCrawler:
+    """
+    Breadth-first crawler of one site that fetches pages concurrently, at most per_host_limit at a time
+    per host and max_pages in total, following links up to max_depth from the seed and honouring robots.txt.
+    Each fetched page is passed to on_page as a {'text', 'page', 'url'} dict.
+    """
+    def __init__(self, seed_url, on_page, max_pages=None, max_depth=None, stop_event=None):
+        self.seed_url = _normalize(seed_url)
+        self.host = urlparse(self.seed_url).netloc
+        self.on_page = on_page
+        self.max_pages = max_pages or settings.CRAWL_MAX_PAGES
+        self.max_depth = settings.CRAWL_MAX_DEPTH if max_depth is None else max_depth
+        self.stop_event = stop_event or threading.Event()
+        self.seen = set()
+        self.page_count = 0
+        self.robots = None
+        self.crawl_delay = 0
+
+    def allowed(self, url):
+        return self.robots is None or self.robots.can_fetch(settings.CRAWL_USER_AGENT, url)
+
+    def enqueue(self, frontier, url, depth):
+        try:
+            url = _normalize(url)
+            if url in self.seen or not _same_site(url, self.host) or not self.allowed(url):
+                return
+        except ValueError:
+            # Malformed links, e.g. an invalid IPv6 host, are skipped
+            return
+        self.seen.add(url)
+        frontier.put_nowait((url, depth))
+
+    async def load_robots(self, client):
+        if not settings.CRAWL_RESPECT_ROBOTS:
+            return
+        robots_url = urljoin(self.seed_url, '/robots.txt')
+        try:
+            response = await client.get(robots_url)
+        except httpx.HTTPError:
+            return
+        if response.status_code >= 400:
+            return
+        self.robots = RobotFileParser(robots_url)
+        self.robots.parse(response.text.splitlines())
+        self.crawl_delay = self.robots.crawl_delay(settings.CRAWL_USER_AGENT) or 0
+
+    async def fetch(self, client, host_slots, url):
+        async with host_slots:
+            response = await client.get(url)
+            if self.crawl_delay:
+                # Holding the slot through the delay spaces out requests to the host
+                await asyncio.sleep(self.crawl_delay)
+        return response
+
+    async def seed(self, client, host_slots, frontier):
+        """
+        Queues the seed page, or the pages of the seed sitemap and its child sitemaps.
+        """
+        response = await self.fetch(client, host_slots, self.seed_url)
+        sitemap = _parse_sitemap(response.content) if 'xml' in response.headers.get('Content-Type', '') else None
+        if sitemap is None:
+            self.enqueue(frontier, self.seed_url, 0)
+            return
+
+        pages, children = sitemap
+        for child_url in children[:MAX_SITEMAPS]:
+            try:
+                child = _parse_sitemap((await self.fetch(client, host_slots, child_url)).content)
+            except (httpx.HTTPError, httpx.InvalidURL, ValueError):
+                continue
+            if child:
+                pages.extend(child[0])
+        # Sitemaps already list the site, so their pages are not followed further
+        for url in pages[:self.max_pages]:
+            self.enqueue(frontier, url, self.max_depth)
+
+    async def worker(self, client, host_slots, frontier):
+        while not self.stop_event.is_set():
+            url, depth = await frontier.get()
+            try:
+                if self.page_count >= self.max_pages:
+                    continue
+                response = await self.fetch(client, host_slots, url)
+                if response.status_code >= 400 or 'html' not in response.headers.get('Content-Type', ''):
+                    continue
+                if self.page_count >= self.max_pages:
+                    continue
+                self.page_count += 1
+                html = response.text
+                await asyncio.to_thread(self.on_page, {'text': html_to_text(html), 'page': self.page_count, 'url': url})
+
+                if depth < self.max_depth:
+                    soup = BeautifulSoup(html, 'html.parser')
+                    for anchor in soup.find_all('a', href=True):
+                        try:
+                            link = urljoin(str(response.url), anchor['href'])
+                        except ValueError:
+                            continue
+                        self.enqueue(frontier, link, depth + 1)
+            except Exception as e:
+                # One bad page must not stop a worker, or the frontier is never drained
+                print(f"Error crawling {url}: {str(e)}")
+            finally:
+                frontier.task_done()
+
+    async def run(self):
+        limits = httpx.Limits(max_connections=settings.CRAWL_CONCURRENCY, max_keepalive_connections=settings.CRAWL_CONCURRENCY)
+        headers = {'User-Agent': settings.CRAWL_USER_AGENT}
+        async with httpx.AsyncClient(limits=limits, headers=headers, timeout=settings.CRAWL_TIMEOUT, follow_redirects=True) as client:
+            host_slots = asyncio.Semaphore(settings.CRAWL_PER_HOST_CONCURRENCY)
+            frontier = asyncio.Queue()
+            await self.load_robots(client)
+            await self.seed(client, host_slots, frontier)
+
+            workers = [
+                asyncio.create_task(self.worker(client, host_slots, frontier))
+                for _ in range(settings.CRAWL_CONCURRENCY)
+            ]
+            done = asyncio.create_task(frontier.join())
+            stopped = asyncio.create_task(asyncio.to_thread(self.stop_event.wait))
+            await asyncio.wait([done, stopped], return_when=asyncio.FIRST_COMPLETED)
+            self.stop_event.set()
+            for task in workers + [done]:
+                task.cancel()
+            await asyncio.gather(*workers, done, stopped, return_exceptions=True)
+
+def crawl_site(seed_url, max_pages=None, max_depth=None):
+    """
+    Crawls the site of a seed page or sitemap URL and yields its pages as they are fetched.
+    The crawl runs on a background event loop and pauses while the consumer falls behind.
+    An error that stops the whole crawl, such as an unreachable seed, is raised once the fetched pages are consumed.
+    """
+    pages = queue.Queue(maxsize=settings.CRAWL_CONCURRENCY * 2)
+    stop_event = threading.Event()
+    errors = []
+
+    def on_page(page):
+        while not stop_event.is_set():
+            try:
+                pages.put(page, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def run():
+        try:
+            asyncio.run(SiteCrawler(seed_url, on_page, max_pages, max_depth, stop_event).run())
+        except Exception as e:
+            print(f"Error crawling {seed_url}: {str(e)}")
+            errors.append(e)
+        finally:
+            stop_event.set()
+            pages.put(_DONE)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    try:
+        while True:
+            page = pages.get()
+            if page is _DONE:
+                break
+            yield page
+        if errors:
+            raise errors[0]
+    finally:
+        stop_event.set()
+        # Unblock the crawler thread if it is waiting on a full queue
+        while thread.is_alive():
+            try:
+                pages.get(timeout=0.1)
+            except queue.Empty:
+                pass
@@ -0,0 +1,118 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.conf import settings
+
+META_FILE_NAME = 'meta.json'
+TEXT_FILE_NAME = 'text.gz'
+
+def _accept_encoding():
+    # urllib3 only decodes brotli responses when a brotli package is installed
+    try:
+        import brotli  # noqa: F401
+        return 'gzip, deflate, br'
+    except ImportError:
+        try:
+            import brotlicffi  # noqa: F401
+            return 'gzip, deflate, br'
+        except ImportError:
+            return 'gzip, deflate'
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_link_session():
+    """
+    Returns the process-wide HTTP session used to fetch links, keeping connections alive per host.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=settings.LINK_POOL_SIZE,
+                    pool_maxsize=settings.LINK_POOL_SIZE,
+                    max_retries=Retry(total=2, backoff_factor=0.5, status_forcelist=(502, 503, 504), allowed_methods=('GET', 'HEAD')),
+                )
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers.update({'User-Agent': settings.LINK_USER_AGENT, 'Accept-Encoding': _accept_encoding()})
+                _session = session
+    return _session
+
+def _cache_dir(url):
+    digest = hashlib.sha256(url.encode('utf-8')).hexdigest()
+    return os.path.join(settings.LINK_CACHE_ROOT, digest[:2], digest)
+
+def _read_cached(url):
+    """
+    Returns the cached metadata and converted text of a URL, or (None, None).
+    """
+    cache_dir = _cache_dir(url)
+    try:
+        with open(os.path.join(cache_dir, META_FILE_NAME)) as f:
+            meta = json.load(f)
+        with gzip.open(os.path.join(cache_dir, TEXT_FILE_NAME), 'rt', encoding='utf-8') as f:
+            return meta, f.read()
+    except (OSError, EOFError, ValueError):
+        return None, None
+
+def _write_cached(url, meta, text):
+    cache_dir = _cache_dir(url)
+    os.makedirs(cache_dir, exist_ok=True)
+    suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+    text_path = os.path.join(cache_dir, TEXT_FILE_NAME)
+    with gzip.open(text_path + suffix, 'wt', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(text_path + suffix, text_path)
+    # Metadata is written last so validators never describe text that is not there yet
+    meta_path = os.path.join(cache_dir, META_FILE_NAME)
+    with open(meta_path + suffix, 'w') as f:
+        json.dump(meta, f)
+    os.replace(meta_path + suffix, meta_path)
+
+def html_to_text(html):
+    """
+    Converts HTML to markdown-like text, as SimpleWebPageReader did.
+    """
+    import html2text
+    return html2text.html2text(html)
+
+def fetch_link(url):
+    """
+    Fetches a URL and returns (text, changed). Cached responses are revalidated with their ETag and
+    Last-Modified validators; on 304 the cached text is returned as is, without converting the page again.
+    """
+    meta, cached_text = _read_cached(url)
+    headers = {}
+    if meta and cached_text is not None:
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    response = get_link_session().get(
+        url, headers=headers, timeout=(settings.LINK_CONNECT_TIMEOUT, settings.LINK_READ_TIMEOUT)
+    )
+    if response.status_code == 304 and cached_text is not None:
+        return cached_text, False
+    response.raise_for_status()
+
+    content_type = response.headers.get('Content-Type', '')
+    text = html_to_text(response.text) if 'html' in content_type or not content_type else response.text
+    changed = cached_text is None or text != cached_text
+    _write_cached(url, {
+        'url': url,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'content_type': content_type,
+        'fetched_at': time.time(),
+    }, text)
+    return text, changed
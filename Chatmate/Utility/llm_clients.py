@@ -0,0 +1,53 @@
+import os
+import threading
+import httpx
+from django.conf import settings
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def _llm_timeout():
+    return httpx.Timeout(settings.LLM_READ_TIMEOUT, connect=settings.LLM_CONNECT_TIMEOUT)
+
+def _create_http_client(**kwargs):
+    return httpx.Client(
+        timeout=_llm_timeout(),
+        limits=httpx.Limits(max_connections=settings.LLM_POOL_SIZE, max_keepalive_connections=settings.LLM_POOL_SIZE),
+        **kwargs,
+    )
+
+def _create_groq_client():
+    from groq import Groq
+    api_key = os.getenv('GROQ_API_KEY')
+    if not api_key:
+        raise ValueError("API key is missing. Please set the GROQ_API_KEY environment variable.")
+    return Groq(
+        api_key=api_key, timeout=_llm_timeout(), max_retries=settings.LLM_MAX_RETRIES, http_client=_create_http_client()
+    )
+
+def _create_huggingface_client():
+    api_token = os.getenv('HUGGINGFACE_API_TOKEN')
+    if not api_token:
+        raise ValueError("API token is missing. Please set the HUGGINGFACE_API_TOKEN environment variable.")
+    return _create_http_client(headers={'Authorization': f"Bearer {api_token}"})
+
+# Factories of the long-lived client of each provider
+LLM_CLIENT_FACTORIES = {
+    'groq': _create_groq_client,
+    'huggingface': _create_huggingface_client,
+}
+
+def get_llm_client(provider):
+    """
+    Returns the shared keep-alive client of a provider, creating it on first use.
+    The clients are httpx-based, thread-safe and reused by every request in the process.
+    """
+    client = _clients.get(provider)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(provider)
+            if client is None:
+                if provider not in LLM_CLIENT_FACTORIES:
+                    raise ValueError(f"Unknown LLM provider: {provider}")
+                client = _clients[provider] = LLM_CLIENT_FACTORIES[provider]()
+    return client
@@ -0,0 +1,99 @@
+import os
+import gzip
+import json
+import hashlib
+import threading
+from django.conf import settings
+
+CACHE_SUFFIX = '.jsonl.gz'
+
+_evict_lock = threading.Lock()
+
+def file_sha256(file_path):
+    """
+    Returns the SHA-256 hex digest of a file on disk, read in blocks.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _cache_path(content_hash, parser_name, parser_version):
+    key = f"{content_hash}-{parser_name}-v{parser_version}"
+    return os.path.join(settings.PARSE_CACHE_ROOT, content_hash[:2], key + CACHE_SUFFIX)
+
+def _read_cached(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+
+def evict_parse_cache(max_bytes=None):
+    """
+    Removes the least recently used cached parses until the cache fits in max_bytes.
+    """
+    max_bytes = settings.PARSE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    with _evict_lock:
+        entries, total = [], 0
+        for directory, _, names in os.walk(settings.PARSE_CACHE_ROOT):
+            for name in names:
+                if not name.endswith(CACHE_SUFFIX):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+def cached_parse(file_path, parser_name, parser_version, parse, content_hash=None):
+    """
+    Yields the pages parse(file_path) would yield, reading them from the parse cache when this file
+    content was already parsed by this parser version. Fresh results are written to the cache as they
+    stream through, compressed, and the cache is then trimmed to PARSE_CACHE_MAX_BYTES.
+    An entry is only committed once parse completes; if it raises or is not read to the end, nothing is cached.
+    """
+    if not settings.PARSE_CACHE_ENABLED:
+        yield from parse(file_path)
+        return
+
+    content_hash = content_hash or file_sha256(file_path)
+    path = _cache_path(content_hash, parser_name, parser_version)
+    try:
+        pages = _read_cached(path)
+        first = next(pages, None)
+        # Hits are touched so eviction drops the least recently used parses first
+        os.utime(path)
+    except (OSError, EOFError, ValueError):
+        first = None
+    if first is not None:
+        yield first
+        yield from pages
+        return
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    count = 0
+    try:
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            for page in parse(file_path):
+                f.write(json.dumps(page) + "\n")
+                count += 1
+                yield page
+        # Empty results are usually failed parses, so they are not cached
+        if count:
+            os.replace(tmp_path, path)
+            evict_parse_cache()
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -1,8 +1,21 @@
+import os
+import re
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from xml.etree import ElementTree
 import PyPDF2
 import docx
-from llama_index.readers.web import SimpleWebPageReader
+from bs4 import BeautifulSoup
+from django.conf import settings
 from llama_index.core import SimpleDirectoryReader
 from llama_parse import LlamaParse
+from Chatmate.Utility.link_fetching import fetch_link
+from Chatmate.Utility.parse_cache import cached_parse
+from Chatmate.Utility.tabular_parsing import (
+    has_excel_reader, iter_csv_chunks, iter_excel_chunks, iter_tsv_chunks, iter_xlsx_chunks
+)
 
 SUPPORTED_FILE_TYPES = [
     '.602', '.abw', '.cgm', '.cwk', '.doc', '.docx', '.docm', 
@@ -15,12 +28,18 @@ SUPPORTED_FILE_TYPES = [
     '.xlsm', '.xlsb', '.xlw', '.csv', '.dif', '.sylk', '.slk', '.prn', 
     '.numbers', '.et', '.ods', '.fods', '.uos1', '.uos2', '.dbf', 
     '.wk1', '.wk2', '.wk3', '.wk4', '.wks', '.123', '.wq1', '.wq2', 
-    '.wb1', '.wb2', '.wb3', '.qpw', '.xlr', '.eth', '.tsv'
+    '.wb1', '.wb2', '.wb3', '.qpw', '.xlr', '.eth', '.tsv', '.md'
 ]
 
-def document_parser(file_path):
+# Bumped whenever a parser's output changes so cached parses are not reused
+PARSER_VERSION = 2
+
+# Plain text files are read in blocks of this many characters
+TEXT_BLOCK_CHARS = 64 * 1024
+
+def document_parser(file_path, raise_errors=False):
     """
-    Parse the text of a document using LlamaParse.
+    Parse the text of a document using LlamaParse. Errors return no documents unless raise_errors is set.
     """
     try:
         extension = get_file_extension(file_path)
@@ -34,23 +53,36 @@ def document_parser(file_path):
         return documents
     except ValueError as ve:
         print(f"Value error: {ve}")
+        if raise_errors:
+            raise
     except Exception as e:
         print(f"Error parsing document: {str(e)}")
+        if raise_errors:
+            raise
     return []
 
-def read_file(file_path):
+def iter_llamaparse(file_path):
     """
-    Reads text from a file based on its file extension.
+    Yields the documents LlamaParse extracts from a file as page dicts.
+    """
+    for doc in document_parser(file_path, raise_errors=True):
+        yield {'text': doc.text}
+
+def read_file(file_path, content_hash=None):
+    """
+    Reads text from a file based on its file extension, as an iterable of page dicts.
+    Formats with a local parser are read in process; everything else goes through LlamaParse.
+    Results are cached by file content hash, so each file is parsed at most once per PARSER_VERSION.
     """
     try:
-        file_type = get_file_extension(file_path)
+        file_type = get_file_extension(file_path).lower()
         
-        if file_type == ".pdf":
-            return [{'text': read_pdf(file_path)}]
-        elif file_type == ".docx":
-            return [{'text': read_docx(file_path)}]
-        else:
-            return [{'text': doc.text} for doc in document_parser(file_path)]
+        parser = FILE_PARSERS.get(file_type, iter_llamaparse)
+        if parser is iter_excel_chunks and not has_excel_reader(file_type):
+            # Cached under LlamaParse, so the file is read locally again once its engine is installed
+            print(f"No local reader for {file_path}, using LlamaParse.")
+            parser = iter_llamaparse
+        return cached_parse(file_path, parser.__name__, PARSER_VERSION, parser, content_hash=content_hash)
     
     except Exception as e:
         print(f"Error reading file: {str(e)}")
@@ -65,15 +97,48 @@ def get_file_extension(file_path):
         raise ValueError("No file extension found in the file path")
     return file_path[file_extension_index:]
 
+def _extract_pdf_pages(file_path, start, stop):
+    """
+    Extracts the text of pages start to stop of a PDF file.
+    """
+    with open(file_path, 'rb') as pdf_file:
+        pdf_reader = PyPDF2.PdfReader(pdf_file)
+        return [pdf_reader.pages[number].extract_text() or '' for number in range(start, stop)]
+
+def iter_pdf_pages(file_path):
+    """
+    Yields the text of each page of a PDF file in order, as {'text', 'page'} dicts with 1-based page numbers.
+    Large files are split into page ranges extracted in parallel processes, with only a few ranges held at once.
+    """
+    with open(file_path, 'rb') as pdf_file:
+        page_count = len(PyPDF2.PdfReader(pdf_file).pages)
+
+    workers = min(settings.PDF_WORKERS or os.cpu_count() or 1, -(-page_count // settings.PDF_PAGES_PER_SHARD))
+    if page_count < settings.PDF_PARALLEL_MIN_PAGES or workers <= 1:
+        for number, text in enumerate(_extract_pdf_pages(file_path, 0, page_count), start=1):
+            yield {'text': text, 'page': number}
+        return
+
+    shards = deque(
+        (start, min(start + settings.PDF_PAGES_PER_SHARD, page_count))
+        for start in range(0, page_count, settings.PDF_PAGES_PER_SHARD)
+    )
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as executor:
+        pending = deque()
+        while shards or pending:
+            while shards and len(pending) < workers * 2:
+                start, stop = shards.popleft()
+                pending.append((start, executor.submit(_extract_pdf_pages, file_path, start, stop)))
+            start, future = pending.popleft()
+            for offset, text in enumerate(future.result()):
+                yield {'text': text, 'page': start + offset + 1}
+
 def read_pdf(file_path):
     """
     Reads text from a PDF file.
     """
     try:
-        with open(file_path, 'rb') as pdf_file:
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            text = "".join([page.extract_text() for page in pdf_reader.pages])
-            return text
+        return "".join(page['text'] for page in iter_pdf_pages(file_path))
     except Exception as e:
         print(f"Error reading PDF: {str(e)}")
         return ""
@@ -89,13 +154,86 @@ def read_docx(file_path):
         print(f"Error reading DOCX: {str(e)}")
         return ""
 
-def link_parser(url):
+def iter_docx(file_path):
+    """
+    Yields the text of a DOCX file as a single page.
+    """
+    doc = docx.Document(file_path)
+    yield {'text': "\n".join(para.text for para in doc.paragraphs)}
+
+def iter_text(file_path):
+    """
+    Yields a plain text file in blocks, decoding it as UTF-8.
+    """
+    with open(file_path, encoding='utf-8', errors='replace') as text_file:
+        while True:
+            block = text_file.read(TEXT_BLOCK_CHARS)
+            if not block:
+                break
+            yield {'text': block}
+
+def iter_html(file_path):
+    """
+    Yields the visible text of an HTML file.
+    """
+    with open(file_path, encoding='utf-8', errors='replace') as html_file:
+        soup = BeautifulSoup(html_file, 'html.parser')
+    for element in soup(['script', 'style', 'noscript']):
+        element.decompose()
+    yield {'text': soup.get_text("\n")}
+
+PPTX_SLIDE_PATH = re.compile(r'ppt/slides/slide(\d+)\.xml$')
+DRAWINGML_TEXT = '{http://schemas.openxmlformats.org/drawingml/2006/main}t'
+DRAWINGML_PARAGRAPH = '{http://schemas.openxmlformats.org/drawingml/2006/main}p'
+
+def iter_pptx(file_path):
+    """
+    Yields the text of each slide of a PPTX presentation as a page, read straight from the slide XML.
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        slides = sorted(
+            (int(match.group(1)), name)
+            for name in archive.namelist()
+            for match in [PPTX_SLIDE_PATH.match(name)] if match
+        )
+        for number, name in slides:
+            root = ElementTree.fromstring(archive.read(name))
+            paragraphs = [
+                ''.join(text.text or '' for text in paragraph.iter(DRAWINGML_TEXT))
+                for paragraph in root.iter(DRAWINGML_PARAGRAPH)
+            ]
+            yield {'text': "\n".join(p for p in paragraphs if p.strip()), 'page': number}
+
+# Formats parsed in process; other supported extensions fall back to LlamaParse.
+# Parsers raise on errors, so a failed parse is never cached as a partial result.
+FILE_PARSERS = {
+    '.pdf': iter_pdf_pages,
+    '.docx': iter_docx,
+    '.txt': iter_text,
+    '.md': iter_text,
+    '.csv': iter_csv_chunks,
+    '.tsv': iter_tsv_chunks,
+    '.htm': iter_html,
+    '.html': iter_html,
+    '.xlsx': iter_xlsx_chunks,
+    '.xlsm': iter_xlsx_chunks,
+    '.xls': iter_excel_chunks,
+    '.ods': iter_excel_chunks,
+    '.pptx': iter_pptx,
+}
+
+def link_parser(url, raise_errors=False):
     """
-    Parses the text of a webpage using LlamaParse.
+    Parses the text of a webpage through the cached, pooled link fetcher.
+    Errors return no pages unless raise_errors is set.
     """
     try:
-        documents = SimpleWebPageReader(html_to_text=True).load_data(url)
-        return [{'text': doc.text} for doc in documents]
+        text, changed = fetch_link(url)
+        if not changed:
+            print(f"Link not modified, using cached text: {url}")
+        return [{'text': text}]
     except Exception as e:
         print(f"Error parsing link: {str(e)}")
+        if raise_errors:
+            raise
         return []
@@ -1,46 +1,52 @@
+from itertools import groupby
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from Chatmate.Utility.general_utility import content_hash
+from Chatmate.Utility.indexing_documents import chunk_position, iter_tagged_chunks, make_chunk_id
+from Chatmate.Utility.link_crawler import crawl_site
 from Chatmate.Utility.parsing_utility import link_parser, read_file
+from Chatmate.Utility.room_index import (
+    LEGACY_DOCUMENT_ID, StagedVectors, get_room_name, get_vector_ref, load_room_index, update_room_index
+)
 
-def compare_chunks(chunk1, chunk2):
+def load_documents(document_ids, raise_errors=False):
     """
-    Compare two chunks based on their text fields.
-    """
-    return chunk1.get('text') == chunk2.get('text')
-
-def load_documents(document_ids):
-    """
-    Load documents from the database, extract text from files and links, and combine results.
+    Load documents from the database and yield the pages extracted from their files and links.
+    Pages are streamed one at a time, so a large file is never held in memory as a whole.
+    Parse and fetch errors are printed and skipped, or raised when raise_errors is set.
     """
     try:
         from Chatmate.models import Documents
         documents = Documents.objects.filter(id__in=document_ids)
 
         print(f"Loaded {len(documents)} documents from the database.")
-        all_chunks = []
 
         for doc in documents:
             # Process file if available
             if doc.file:
                 try:
-                    file_chunks = read_file(doc.file.path)
-                    all_chunks.extend(file_chunks)
+                    for page in read_file(doc.file.path, content_hash=doc.content_hash or None):
+                        yield {**chunk_to_dict(page), 'document': doc.id}
                 except Exception as e:
                     print(f"Error parsing document at {doc.file.path}: {str(e)}")
+                    if raise_errors:
+                        raise
 
             # Process link if available
             if doc.link:
                 try:
-                    link_chunks = link_parser(doc.link)
-                    all_chunks.extend(link_chunks)
+                    pages = crawl_site(doc.link) if doc.crawl else link_parser(doc.link, raise_errors=True)
+                    for page in pages:
+                        yield {**chunk_to_dict(page), 'document': doc.id}
                 except Exception as e:
                     print(f"Error parsing links: {str(e)}")
-
-        # Ensure all_chunks only contains JSON-serializable data
-        all_chunks = [chunk_to_dict(chunk) for chunk in all_chunks]
-
-        return all_chunks
+                    if raise_errors:
+                        raise
     except Exception as e:
         print(f"Error loading documents: {str(e)}")
-        return []
+        if raise_errors:
+            raise
 
 def chunk_to_dict(chunk):
     """
@@ -57,40 +63,207 @@ def chunk_to_dict(chunk):
         print(f"Error converting chunk to dict: {str(e)}")
         return {}
 
-def update_combined_chunks(document_ids, room=None, delete=False):
+def find_duplicate_chunks(document):
     """
-    Update the combined chunks in the database for a specific room. Optionally, delete chunks that match existing ones.
+    Returns the (text, page_start, page_end) rows of the chunks of another document uploaded with
+    the same file, or None if there is none.
     """
-    from Chatmate.models import CombinedChunk
-    try:
-        all_chunks = load_documents(document_ids)
-        
-        combined_chunk_instance, created = CombinedChunk.objects.get_or_create(
-            room=room,
-            defaults={'chunks': all_chunks}
-        )
+    from Chatmate.models import Chunk, Documents
+    if not document.content_hash or document.link:
+        return None
+    source = (
+        Documents.objects
+        .filter(content_hash=document.content_hash, chunks__isnull=False)
+        .filter(Q(link__isnull=True) | Q(link=''))
+        .exclude(id=document.id)
+        .first()
+    )
+    if source is None:
+        return None
+    return list(
+        Chunk.objects.filter(document=source).order_by('position').values_list('text', 'page_start', 'page_end')
+    )
 
-        if delete:
-            # Filter out chunks from combined_chunk_instance that are similar to any in all_chunks
-            new_chunks = [
-                chunk for chunk in combined_chunk_instance.chunks
-                if not any(compare_chunks(chunk, ac) for ac in all_chunks)
-            ]
-
-            # Update the chunks field only if there's a change
-            if len(new_chunks) != len(combined_chunk_instance.chunks):
-                combined_chunk_instance.chunks = new_chunks
-                combined_chunk_instance.save()
-                print("Deleted similar chunks from combined chunks successfully.")
-            else:
-                print("No matching chunks found for deletion.")
-
-        # If combined chunks already existed, update them
-        if not created:
-            combined_chunk_instance.chunks = all_chunks
-            combined_chunk_instance.save()
-            print("Combined chunks updated successfully.")
+def _chunk_pages(pages):
+    """
+    Yields (text, first_page, last_page) chunks from a document's pages. Runs of pages that parsers
+    already chunked, such as spreadsheet rows under their header, are kept as they are.
+    """
+    for chunked, run in groupby(pages, key=lambda page: page.get('chunked', False)):
+        if chunked:
+            for page in run:
+                yield page['text'], page.get('page'), page.get('page')
         else:
-            print("Combined chunks created successfully.")
+            pieces = ((page.get('text', '') + "\n\n", page.get('page')) for page in run)
+            yield from iter_tagged_chunks(pieces)
+
+def iter_document_chunks(document_ids, progress=None, raise_errors=False):
+    """
+    Load documents and yield their chunks, with stable IDs derived from the document ID and chunk position, as they are produced.
+    Each document's pages are chunked as one stream, so chunks may span page breaks. Files already
+    uploaded elsewhere reuse the stored chunks of that upload instead of being parsed again.
+    Chunks keep the first and last page they were read from when the parser reports pages.
+    The optional progress callback is called with 'parsed' and then 'chunked'.
+    With raise_errors set, a document that fails to parse raises instead of yielding no chunks.
+    """
+    from Chatmate.models import Documents
+    parse_ids = []
+    for document in Documents.objects.filter(id__in=document_ids):
+        rows = find_duplicate_chunks(document)
+        if rows is None:
+            parse_ids.append(document.id)
+            continue
+        print(f"Reusing chunks of an identical file for document {document.id}.")
+        for position, (text, first, last) in enumerate(rows):
+            yield {'id': make_chunk_id(document.id, position), 'document': document.id, 'text': text, 'pages': [first, last]}
+
+    # Pages are parsed as chunking consumes them
+    for document_id, pages in groupby(load_documents(parse_ids, raise_errors=raise_errors), key=lambda page: page['document']):
+        for position, (text, first, last) in enumerate(_chunk_pages(pages)):
+            yield {
+                'id': make_chunk_id(document_id, position), 'document': document_id, 'text': text, 'pages': [first, last]
+            }
+    if progress:
+        progress('parsed')
+        progress('chunked')
+
+def update_document_chunks(document_ids, room=None, delete=False, progress=None, raise_errors=False):
+    """
+    Update the stored chunks of a room for the given documents. Rows whose position still exists are
+    updated in place, or all rows are removed when delete is set, and the room index is updated for those documents alone.
+    The optional progress callback receives each ingestion stage as it completes. Chunks are embedded in
+    batches of INGESTION_EMBED_BATCH while parsing or crawling goes on, with their vectors staged on disk.
+    """
+    from Chatmate.models import Chunk
+    staged = StagedVectors(room)
+    try:
+        document_ids = set(document_ids)
+        new_chunks, batch = [], []
+        if not delete:
+            for chunk in iter_document_chunks(document_ids, progress=progress, raise_errors=raise_errors):
+                new_chunks.append(chunk)
+                batch.append(chunk)
+                if len(batch) >= settings.INGESTION_EMBED_BATCH:
+                    staged.add(batch)
+                    batch = []
+            if batch:
+                staged.add(batch)
+
+        with transaction.atomic():
+            existing = {
+                chunk.chunk_id: chunk
+                for chunk in Chunk.objects.filter(room=room, document_id__in=document_ids)
+            }
+            created, updated, changed_ids = [], [], set()
+            for chunk in new_chunks:
+                text_hash = content_hash(chunk['text'])
+                page_start, page_end = chunk.get('pages') or (None, None)
+                row = existing.pop(chunk['id'], None)
+                if row is None or row.content_hash != text_hash:
+                    changed_ids.add(chunk['document'])
+                if row is None:
+                    created.append(Chunk(
+                        room_id=get_room_name(room), document_id=chunk['document'], chunk_id=chunk['id'],
+                        position=chunk_position(chunk['id']), content_hash=text_hash, text=chunk['text'],
+                        page_start=page_start, page_end=page_end,
+                    ))
+                elif row.content_hash != text_hash or (row.page_start, row.page_end) != (page_start, page_end):
+                    if row.content_hash != text_hash:
+                        # The stored vector row still holds the old text, so the reference is relinked after indexing
+                        row.vector_file, row.vector_row = '', None
+                    row.text, row.content_hash = chunk['text'], text_hash
+                    row.page_start, row.page_end = page_start, page_end
+                    updated.append(row)
+
+            Chunk.objects.bulk_create(created, batch_size=500)
+            Chunk.objects.bulk_update(
+                updated, ['text', 'content_hash', 'page_start', 'page_end', 'vector_file', 'vector_row'], batch_size=500
+            )
+            # Positions past the new end of a document are dropped with one indexed delete
+            if existing:
+                Chunk.objects.filter(id__in=[row.id for row in existing.values()]).delete()
+                changed_ids.update(row.document_id for row in existing.values())
+        print(f"Stored chunks updated: {len(created)} created, {len(updated)} updated, {len(existing)} removed.")
+
+        # Documents whose chunk texts are unchanged and already indexed, e.g. a link answered with 304, are left alone
+        unchanged_ids = document_ids - changed_ids
+        if unchanged_ids and not delete:
+            _, indexed = load_room_index(room)
+            unchanged_ids = {
+                document_id for document_id in unchanged_ids
+                if all(indexed.get(chunk['id']) == chunk['text'] for chunk in new_chunks if chunk['document'] == document_id)
+            }
+        index_ids = document_ids - unchanged_ids if not delete else document_ids
+        if not index_ids:
+            print("Document chunks unchanged, room index left as is.")
+            return
+        update_room_index(
+            room, index_ids, [chunk for chunk in new_chunks if chunk['document'] in index_ids],
+            progress=progress, staged=staged,
+        )
     except Exception as e:
-        print(f"Error updating combined chunks: {str(e)}")
+        if raise_errors:
+            raise
+        print(f"Error updating document chunks: {str(e)}")
+    finally:
+        staged.discard()
+
+def document_chunk_rooms(document_id, exclude=None):
+    """
+    Returns the names of the rooms holding stored chunks of a document, other than exclude.
+    """
+    from Chatmate.models import Chunk
+    rows = Chunk.objects.filter(document_id=document_id).exclude(room=exclude)
+    return set(rows.values_list('room_id', flat=True).distinct())
+
+def move_document_chunks(document, room, progress=None):
+    """
+    Move the stored chunks of a document from the rooms it was in to room without parsing it again.
+    The new room index is updated first, reusing the vectors already stored for the chunks, then the rows
+    are moved and the previous room index drops them. If a step fails, the rows are moved back, the new
+    room index drops the document again and the error is raised.
+    """
+    from Chatmate.models import Chunk
+    room_name = get_room_name(room)
+    for previous_room in document_chunk_rooms(document.id, exclude=room_name):
+        if Chunk.objects.filter(room=room_name, document=document).exists():
+            # The document was already indexed into the new room, so the old chunks are only dropped
+            update_document_chunks(document_ids=[document.id], room=previous_room, delete=True, raise_errors=True)
+            continue
+
+        chunks = [
+            {'id': chunk_id, 'document': document.id, 'text': text}
+            for chunk_id, text in Chunk.objects.filter(room=previous_room, document=document)
+            .order_by('position').values_list('chunk_id', 'text')
+        ]
+        moved = False
+        try:
+            update_room_index(room, {document.id}, chunks, progress=progress)
+            Chunk.objects.filter(room=previous_room, document=document).update(
+                room=room_name, vector_file=get_vector_ref(room, document.id), vector_row=F('position')
+            )
+            moved = True
+            update_room_index(previous_room, {document.id}, [])
+        except Exception as e:
+            print(f"Error moving document chunks, moving them back: {str(e)}")
+            if moved:
+                Chunk.objects.filter(room=room_name, document=document).update(
+                    room=previous_room, vector_file=get_vector_ref(previous_room, document.id), vector_row=F('position')
+                )
+            try:
+                update_room_index(room, {document.id}, [])
+            except Exception as cleanup_error:
+                print(f"Error dropping moved chunks from room {room_name}: {str(cleanup_error)}")
+            raise
+        print(f"Moved {len(chunks)} chunks to room {room_name}.")
+
+def drop_legacy_chunks(room):
+    """
+    Removes the chunks a room stored without their document, and their vectors, from the room and its index.
+    Returns how many chunks were removed.
+    """
+    from Chatmate.models import Chunk
+    removed, _ = Chunk.objects.filter(room=get_room_name(room), document__isnull=True).delete()
+    if removed:
+        update_room_index(room, {LEGACY_DOCUMENT_ID}, [])
+    return removed
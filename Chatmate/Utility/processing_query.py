@@ -1,86 +1,76 @@
-import os
 import numpy as np
 import faiss
+from django.conf import settings
+from Chatmate.Utility.conversation_summary import unsummarized_turns
 from Chatmate.Utility.groq_response import generate_response_with_llama
-from Chatmate.Utility.indexing_documents import compute_embeddings, create_index, process_documents, process_texts, retrieve_chunks
-from Chatmate.models import CombinedChunk, Query
+from Chatmate.Utility.indexing_documents import encode_query, search_chunks
+from Chatmate.Utility.prompt_builder import build_prompt
+from Chatmate.Utility.room_index import load_room_index
+from Chatmate.models import Query, Rooms
+
+# Distance step between recent turns, so older ones are the first dropped when the prompt budget runs out
+RECENT_TURN_RANK_STEP = 1e-3
 
 def process_query(query, room_name):
-    """Process a user query by retrieving relevant documents and generating a response."""
+    """Process a user query by retrieving relevant documents and generating a response.
+    Returns the response and the number of prompt tokens sent to the model."""
+    prompt_tokens = None
     try:
-        context = context_extraction(query, room_name)
-        previous_context = process_history(room_name)
-        additional_note = (
-            "Provide a detailed and thorough answer. "
-            "Use a natural and conversational tone, "
-            "and ensure the response feels engaging and human-like."
-        )
-        combined_input = (
-            f"Context: {context}\n\n"
-            f"Chat History: {previous_context}\n\n"
-            f"Question: {query}\n\n"
-            f"Additional Note: {additional_note}\n\n"
-            "Answer:"
-        )
+        # The question is encoded once and shared by document and history retrieval
+        query_embedding = encode_query(query)
+        context = context_extraction(query_embedding, room_name)
+
+        # Once a room has a rolling summary it replaces older history, and the latest turns
+        # not folded into it yet are sent in full, ranked newest first
+        room = Rooms.objects.get(name=room_name)
+        if room.summary:
+            recent = unsummarized_turns(room, limit=settings.SUMMARY_RECENT_TURNS)
+            previous_context = [
+                (turn.history_text(), (len(recent) - 1 - order) * RECENT_TURN_RANK_STEP)
+                for order, turn in enumerate(recent)
+            ]
+        else:
+            previous_context = process_history(query_embedding, room_name)
+
+        combined_input, prompt_tokens = build_prompt(query, context, previous_context, summary=room.summary)
         response = generate_response_with_llama(combined_input)
     except Exception as e:
         print(f"Error processing query: {e}")
         response = "An error occurred while processing your query. Please try again later."
-    return response
+    return response, prompt_tokens
 
-def context_extraction(query, room_name):
-    """Extract context from the indexed documents."""
+def context_extraction(query_embedding, room_name):
+    """Extract (text, distance) pairs for the most relevant chunks of the persisted room index."""
     try:
-        chunk = CombinedChunk.objects.get(room=room_name).chunks
-        if not chunk:
-            return "No documents found."
-
-        # Process documents and create an index
-        chunks = process_documents(chunk)
-        embeddings = compute_embeddings(chunks)
-        index = create_index(np.array(embeddings))
-
-        # Write and read FAISS index
-        faiss.write_index(index, "chunks_index.faiss")
-        index = faiss.read_index("chunks_index.faiss")
+        index, chunks = load_room_index(room_name)
+        if index is None:
+            return []
 
-        # Retrieve relevant chunks and clean up
-        relevant_chunks, _ = retrieve_chunks(query, index, chunks)
-        os.remove("chunks_index.faiss")
-
-        context = "\n".join([chunk.text for chunk in relevant_chunks])
-    except CombinedChunk.DoesNotExist:
-        print(f"CombinedChunk with room={room_name} does not exist.")
-        context = "No documents found."
+        # Only the query is embedded here, the room chunks were indexed on upload
+        relevant_chunks, distances = search_chunks(query_embedding, index, chunks, settings.PROMPT_CONTEXT_CANDIDATES)
+        return list(zip(relevant_chunks, distances[0].tolist()))
     except Exception as e:
         print(f"Error extracting context: {e}")
-        context = "An error occurred while extracting context."
-    return context
+        return []
 
-def process_history(room_name):
-    """Process the chat history to extract the context."""
+def process_history(query_embedding, room_name):
+    """Retrieve (text, distance) pairs for the past turns most relevant to the query, oldest first."""
     try:
-        prev_queries = Query.objects.filter(room=room_name)
-        if not prev_queries.exists():
-            return "No chat history found."
-
-        chats = [f"{query.query_text}\n{query.response_text}" for query in prev_queries]
-
-        # Process chat history and create an index
-        chunks = process_texts(chats)
-        embeddings = compute_embeddings(chunks)
-        index = create_index(np.array(embeddings))
-
-        # Write and read FAISS index
-        faiss.write_index(index, "history_index.faiss")
-        index = faiss.read_index("history_index.faiss")
+        prev_queries = Query.objects.filter(room=room_name).order_by('-created_at')
+        if settings.HISTORY_WINDOW:
+            prev_queries = prev_queries[:settings.HISTORY_WINDOW]
+        prev_queries = list(prev_queries)
+        if not prev_queries:
+            return []
 
-        # Retrieve relevant chunks and clean up
-        relevant_chunks, _ = retrieve_chunks("", index, chunks)
-        os.remove("history_index.faiss")
+        # Past turns were embedded when saved, so only the question is encoded
+        vectors = np.vstack([prev_query.get_embedding() for prev_query in prev_queries])
+        top_k = min(settings.HISTORY_TOP_K, len(prev_queries))
+        distances, rows = faiss.knn(np.asarray(query_embedding, dtype='float32'), vectors, top_k)
 
-        context = "\n".join([chunk.text for chunk in relevant_chunks])
+        # Turns are newest first, so walking rows in reverse keeps the history chronological
+        matches = sorted(zip(rows[0].tolist(), distances[0].tolist()), reverse=True)
+        return [(prev_queries[row].history_text(), distance) for row, distance in matches]
     except Exception as e:
         print(f"Error processing history: {e}")
-        context = "An error occurred while processing chat history."
-    return context
+        return []
@@ -0,0 +1,81 @@
+from functools import lru_cache
+from django.conf import settings
+from Chatmate.Utility import token_counting
+
+PROMPT_TEMPLATE = (
+    "Context: {context}\n\n"
+    "{summary}"
+    "Chat History: {history}\n\n"
+    "Question: {query}\n\n"
+    "Additional Note: {note}\n\n"
+    "Answer:"
+)
+
+ADDITIONAL_NOTE = (
+    "Provide a detailed and thorough answer. "
+    "Use a natural and conversational tone, "
+    "and ensure the response feels engaging and human-like."
+)
+
+def _count(text):
+    return token_counting.count_tokens(text, settings.PROMPT_TOKENIZER)
+
+@lru_cache(maxsize=4096)
+def count_tokens(text):
+    """
+    Counts the prompt tokens of a chunk. Chunks repeat across turns, so counts are cached.
+    """
+    return _count(text)
+
+def _is_near_duplicate(words, selected_words):
+    """
+    Checks whether a chunk's word set overlaps an already selected chunk beyond the threshold.
+    """
+    for other in selected_words:
+        union = len(words | other)
+        if union and len(words & other) / union >= settings.PROMPT_DUPLICATE_THRESHOLD:
+            return True
+    return False
+
+def build_prompt(query, context_chunks, history_chunks, summary='', note=ADDITIONAL_NOTE):
+    """
+    Assembles the LLM prompt within the token budget. Context and history chunks are given as
+    (text, distance) pairs in display order. They are added in order of relevance, skipping chunks
+    beyond the distance threshold and near-duplicates. History may use at most PROMPT_HISTORY_SHARE of
+    the budget, so the rest stays reserved for context. A conversation summary is always included.
+    Returns the prompt and its token count.
+    """
+    summary = f"Conversation Summary: {summary}\n\n" if summary else ''
+    fixed_prompt = PROMPT_TEMPLATE.format(context='', summary=summary, history='', query=query, note=note)
+    budget = settings.PROMPT_TOKEN_BUDGET - _count(fixed_prompt)
+    history_budget = int(budget * settings.PROMPT_HISTORY_SHARE)
+
+    candidates = [('context', order, text, distance) for order, (text, distance) in enumerate(context_chunks)]
+    candidates += [('history', order, text, distance) for order, (text, distance) in enumerate(history_chunks)]
+    candidates.sort(key=lambda candidate: candidate[3])
+
+    selected = {'context': [], 'history': []}
+    selected_words = []
+    for kind, order, text, distance in candidates:
+        if settings.PROMPT_MAX_DISTANCE and distance > settings.PROMPT_MAX_DISTANCE:
+            break
+        words = set(text.lower().split())
+        if _is_near_duplicate(words, selected_words):
+            continue
+        tokens = count_tokens(text)
+        if tokens > budget or (kind == 'history' and tokens > history_budget):
+            continue
+        budget -= tokens
+        if kind == 'history':
+            history_budget -= tokens
+        selected[kind].append((order, text))
+        selected_words.append(words)
+
+    prompt = PROMPT_TEMPLATE.format(
+        context="\n".join(text for _, text in sorted(selected['context'])) or "No relevant documents found.",
+        summary=summary,
+        history="\n".join(text for _, text in sorted(selected['history'])) or "No relevant chat history found.",
+        query=query,
+        note=note,
+    )
+    return prompt, _count(prompt)
@@ -0,0 +1,613 @@
+import os
+import json
+import fcntl
+import shutil
+import hashlib
+import tempfile
+import uuid
+from contextlib import contextmanager
+import numpy as np
+import faiss
+from django.conf import settings
+from django.utils.text import slugify
+
+from Chatmate.Utility.general_utility import content_hash
+from Chatmate.Utility.index_cache import room_index_cache
+from Chatmate.Utility.indexing_documents import (
+    EMBEDDING_MODEL_NAME, REFERENCE_EMBEDDING_BACKEND, REMOVABLE_INDEX_TYPES, DocumentChunk, chunk_document_id,
+    compute_embeddings, create_index, make_chunk_id, needs_training, select_compression, select_index_type, tombstone_ids,
+    tombstone_search_params, tune_index
+)
+
+META_FILE_NAME = 'meta.json'
+LOCK_FILE_NAME = '.lock'
+VECTORS_DIR_NAME = 'vectors'
+STAGING_DIR_NAME = 'staging'
+
+# Bumped whenever the on-disk layout changes so older room indexes are rebuilt once
+INDEX_FORMAT = 3
+
+# Chunks stored before they carried document IDs are indexed under this document
+LEGACY_DOCUMENT_ID = 0
+
+def get_room_name(room):
+    """
+    Returns the room name for either a Rooms instance or a plain name.
+    """
+    return getattr(room, 'name', room)
+
+def get_room_index_dir(room):
+    """
+    Returns the directory holding the persisted index files of a room.
+    """
+    room_name = get_room_name(room)
+    digest = hashlib.sha1(room_name.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(settings.INDEX_ROOT, f"{slugify(room_name) or 'room'}-{digest}")
+
+@contextmanager
+def room_index_lock(room):
+    """
+    Serializes writers of a room index across threads and worker processes.
+    """
+    index_dir = get_room_index_dir(room)
+    os.makedirs(index_dir, exist_ok=True)
+    with open(os.path.join(index_dir, LOCK_FILE_NAME), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield index_dir
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _atomic_write(path, write):
+    """
+    Writes a file through a temporary path so readers never see a partial file.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+def _write_json(path, data):
+    def write(tmp_path):
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+    _atomic_write(path, write)
+
+def _read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+def _write_array(path, array):
+    def write(tmp_path):
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array)
+    _atomic_write(path, write)
+
+def _write_vectors(path, vectors):
+    # Staged vectors are memory-mapped, so they are written without a copy when no conversion is needed
+    _write_array(path, vectors.astype(settings.VECTOR_STORAGE_DTYPE, copy=False))
+
+def _read_vectors(path):
+    return np.load(path).astype('float32', copy=False)
+
+def _version_paths(index_dir, version):
+    return (
+        os.path.join(index_dir, f"index-{version}.faiss"),
+        os.path.join(index_dir, f"chunks-{version}.json"),
+    )
+
+def _vectors_path(index_dir, document_id):
+    return os.path.join(index_dir, VECTORS_DIR_NAME, f"{document_id}.npy")
+
+def _read_meta(index_dir):
+    meta_path = os.path.join(index_dir, META_FILE_NAME)
+    if not os.path.exists(meta_path):
+        return None
+    return _read_json(meta_path)
+
+def _vectors_reusable(meta):
+    """
+    Checks that stored document vectors match the current layout, embedding model and backend.
+    Indexes written before the backend was recorded were encoded with the reference backend.
+    """
+    return (
+        bool(meta)
+        and meta.get('format') == INDEX_FORMAT
+        and meta.get('model') == EMBEDDING_MODEL_NAME
+        and meta.get('backend', REFERENCE_EMBEDDING_BACKEND) == settings.EMBEDDING_BACKEND
+    )
+
+def _layout_changed(meta, count):
+    """
+    Checks whether an index of this size should now use another index type or compression.
+    """
+    return (
+        meta.get('index_type', 'flat') != select_index_type(count)
+        or meta.get('compression', 'none') != select_compression(count)
+    )
+
+def _build_key(meta):
+    # Versions restart at 1 once a room index is cleared or deleted, so loaded indexes are keyed by a build token
+    return meta.get('build') or meta['version']
+
+def _is_current(meta):
+    """
+    Checks that a persisted index matches the current layout, embedding model and index settings.
+    """
+    return _vectors_reusable(meta) and not _layout_changed(meta, meta.get('count', 0))
+
+def read_room_meta(room):
+    """
+    Reads the metadata of the persisted room index, or None if it was never built.
+    """
+    return _read_meta(get_room_index_dir(room))
+
+class MappedFlatIndex:
+    """
+    Exact search over a memory-mapped float32 matrix. Every worker on a node shares the
+    page-cache copy of the file, and opening it costs page faults instead of a full read.
+    """
+    def __init__(self, ids, vectors):
+        self.ids = ids
+        self.vectors = vectors
+        self.d = vectors.shape[1]
+        self.ntotal = len(vectors)
+
+    def search(self, queries, k):
+        distances, rows = faiss.knn(np.ascontiguousarray(queries, dtype='float32'), self.vectors, min(k, self.ntotal))
+        ids = np.where(rows >= 0, self.ids[np.maximum(rows, 0)], -1)
+        if k > self.ntotal:
+            # Pad like FAISS indexes do when fewer than k vectors exist
+            padding = k - self.ntotal
+            distances = np.pad(distances, ((0, 0), (0, padding)), constant_values=np.inf)
+            ids = np.pad(ids, ((0, 0), (0, padding)), constant_values=-1)
+        return distances, ids
+
+class TombstonedIndex:
+    """
+    Searches an HNSW index whose removed vectors are still in the graph, skipping their rows.
+    """
+    def __init__(self, index):
+        self.index = index
+        self.d = index.d
+        self.ntotal = index.ntotal
+
+    def search(self, queries, k):
+        # IndexIDMap2 swaps the selector of the parameters during a search, so each call gets its own
+        params, selector = tombstone_search_params()
+        distances, ids = self.index.search(np.ascontiguousarray(queries, dtype='float32'), k, params=params)
+        return distances, ids
+
+def _mapped_paths(index_dir, version):
+    return (
+        os.path.join(index_dir, f"ids-{version}.npy"),
+        os.path.join(index_dir, f"matrix-{version}.npy"),
+    )
+
+def _is_mappable(meta):
+    return meta.get('index_type', 'flat') == 'flat' and meta.get('compression', 'none') == 'none'
+
+def _read_index_mapped(index_dir, meta):
+    """
+    Opens a persisted index read-only without copying it onto the heap. Exact flat indexes use
+    memory-mapped .npy files; other types use FAISS mmap support and fall back to a regular read.
+    """
+    ids_path, matrix_path = _mapped_paths(index_dir, meta['version'])
+    if _is_mappable(meta) and os.path.exists(ids_path) and os.path.exists(matrix_path):
+        return MappedFlatIndex(np.load(ids_path, mmap_mode='r'), np.load(matrix_path, mmap_mode='r'))
+
+    index_path, _ = _version_paths(index_dir, meta['version'])
+    try:
+        return faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        if not os.path.exists(index_path):
+            raise
+        return faiss.read_index(index_path)
+
+def _read_version(index_dir, meta, mapped=False):
+    """
+    Reads an index version with its chunk texts. Mapped indexes are read-only and only fit for search.
+    """
+    index_path, chunks_path = _version_paths(index_dir, meta['version'])
+    index = _read_index_mapped(index_dir, meta) if mapped else faiss.read_index(index_path)
+    texts = {int(chunk_id): text for chunk_id, text in _read_json(chunks_path).items()}
+    return tune_index(index), texts
+
+def _write_mapped_matrix(index_dir, version, index):
+    """
+    Dumps the vectors and IDs of an exact flat index as .npy files that readers can memory-map.
+    """
+    ids_path, matrix_path = _mapped_paths(index_dir, version)
+    base_index = faiss.downcast_index(index.index)
+    ids = faiss.vector_to_array(index.id_map).astype('int64')
+    vectors = base_index.reconstruct_n(0, base_index.ntotal)
+    _write_array(ids_path, ids)
+    _write_array(matrix_path, np.ascontiguousarray(vectors, dtype='float32'))
+
+def _write_version(index_dir, previous, index, texts, tombstones=0, trained=None):
+    """
+    Persists an index with its chunk texts as a new version and drops the previous one.
+    tombstones counts the removed vectors still held by an HNSW index, and trained the vectors
+    the index was trained on, which defaults to all of them for a freshly built index.
+    """
+    version = previous['version'] + 1 if previous else 1
+
+    index_path, chunks_path = _version_paths(index_dir, version)
+    _atomic_write(index_path, lambda tmp_path: faiss.write_index(index, tmp_path))
+    _write_json(chunks_path, {str(chunk_id): text for chunk_id, text in texts.items()})
+    if settings.INDEX_MMAP and _is_mappable({
+        'index_type': select_index_type(len(texts)),
+        'compression': select_compression(len(texts)),
+    }):
+        _write_mapped_matrix(index_dir, version, index)
+    _write_json(os.path.join(index_dir, META_FILE_NAME), {
+        'format': INDEX_FORMAT,
+        'version': version,
+        'build': uuid.uuid4().hex,
+        'count': len(texts),
+        'model': EMBEDDING_MODEL_NAME,
+        'backend': settings.EMBEDDING_BACKEND,
+        'dimension': int(index.d),
+        'index_type': select_index_type(len(texts)),
+        'compression': select_compression(len(texts)),
+        'tombstones': tombstones,
+        'trained': len(texts) if trained is None else trained,
+    })
+
+    if previous:
+        _remove_version(index_dir, previous['version'])
+    return version
+
+def _remove_version(index_dir, version):
+    for path in _version_paths(index_dir, version) + _mapped_paths(index_dir, version):
+        if os.path.exists(path):
+            os.remove(path)
+
+def _clear_room_index(index_dir):
+    """
+    Drops the index files of a room whose last chunks were removed, keeping the lock file.
+    """
+    meta = _read_meta(index_dir)
+    if meta:
+        os.remove(os.path.join(index_dir, META_FILE_NAME))
+        _remove_version(index_dir, meta['version'])
+    shutil.rmtree(os.path.join(index_dir, VECTORS_DIR_NAME), ignore_errors=True)
+
+def _cached_vectors(hashes):
+    """
+    Looks up stored vectors by chunk content hash, across every room indexed with the current model and backend.
+    Returns a dict of hash to float32 vector for the hashes found.
+    """
+    from Chatmate.models import Chunk
+    refs = {}
+    hashes = list(set(hashes))
+    for start in range(0, len(hashes), 500):
+        rows = (
+            Chunk.objects.filter(content_hash__in=hashes[start:start + 500])
+            .exclude(vector_file='')
+            .values_list('content_hash', 'vector_file', 'vector_row')
+        )
+        for text_hash, vector_file, vector_row in rows:
+            refs.setdefault(text_hash, (vector_file, vector_row))
+
+    by_file = {}
+    for text_hash, (vector_file, vector_row) in refs.items():
+        by_file.setdefault(vector_file, []).append((text_hash, vector_row))
+
+    found = {}
+    for vector_file, entries in by_file.items():
+        path = os.path.join(settings.INDEX_ROOT, vector_file)
+        index_dir = os.path.dirname(os.path.dirname(path))
+        try:
+            if not _vectors_reusable(_read_meta(index_dir)):
+                continue
+            matrix = np.load(path, mmap_mode='r')
+        except (OSError, ValueError):
+            continue
+        for text_hash, vector_row in entries:
+            if vector_row is not None and vector_row < len(matrix):
+                found[text_hash] = np.asarray(matrix[vector_row], dtype='float32')
+    return found
+
+def _encode_document_chunks(document_chunks):
+    """
+    Encodes chunks whose content hash has no stored vector yet and reuses the vectors of the rest.
+    """
+    hashes = [content_hash(chunk['text']) for chunk in document_chunks]
+    cached = _cached_vectors(hashes)
+    missing = [i for i, text_hash in enumerate(hashes) if text_hash not in cached]
+    if missing:
+        objects = [DocumentChunk(id_=document_chunks[i]['id'], chunk_id=i, text=document_chunks[i]['text']) for i in missing]
+        encoded = np.asarray(compute_embeddings(objects), dtype='float32')
+        for i, vector in zip(missing, encoded):
+            cached[hashes[i]] = vector
+    if len(missing) < len(hashes):
+        print(f"Reused stored vectors for {len(hashes) - len(missing)} of {len(hashes)} chunks.")
+    return np.vstack([cached[text_hash] for text_hash in hashes]).astype('float32', copy=False)
+
+class StagedVectors:
+    """
+    Embeds chunks in bounded batches while their documents are still being parsed, appending each
+    document's vectors to a raw float32 file so only one batch is held in memory at a time.
+    update_room_index then stores and indexes the staged vectors instead of encoding the chunks again.
+    """
+    def __init__(self, room):
+        self.room = room
+        self.paths = {}
+        self.counts = {}
+        self.dimension = None
+
+    def add(self, chunks):
+        """
+        Embeds a batch of chunks, given in document order, and appends their vectors to the staging files.
+        """
+        by_document = {}
+        for chunk in chunks:
+            by_document.setdefault(chunk['document'], []).append(chunk)
+
+        staging_dir = os.path.join(get_room_index_dir(self.room), STAGING_DIR_NAME)
+        os.makedirs(staging_dir, exist_ok=True)
+        for document_id, document_chunks in by_document.items():
+            vectors = np.ascontiguousarray(_encode_document_chunks(document_chunks), dtype='float32')
+            if document_id not in self.paths:
+                handle, self.paths[document_id] = tempfile.mkstemp(
+                    prefix=f"{document_id}-", suffix='.f32', dir=staging_dir
+                )
+                os.close(handle)
+            with open(self.paths[document_id], 'ab') as f:
+                f.write(vectors.tobytes())
+            self.counts[document_id] = self.counts.get(document_id, 0) + len(vectors)
+            self.dimension = vectors.shape[1]
+
+    def get(self, document_id, count):
+        """
+        Returns the staged vectors of a document memory-mapped, or None unless exactly count were staged.
+        """
+        if not count or self.counts.get(document_id) != count:
+            return None
+        return np.memmap(self.paths[document_id], dtype='float32', mode='r', shape=(count, self.dimension))
+
+    def discard(self):
+        for path in self.paths.values():
+            if os.path.exists(path):
+                os.remove(path)
+        self.paths, self.counts = {}, {}
+
+def _embed_document_chunks(index_dir, chunks, reuse=False, staged=None):
+    """
+    Embeds chunks and stores each document's vectors as a float32 matrix.
+    With reuse set, documents whose vectors are already stored are not encoded again, and
+    documents whose vectors were staged while they were parsed take them from staged.
+    """
+    os.makedirs(os.path.join(index_dir, VECTORS_DIR_NAME), exist_ok=True)
+
+    by_document = {}
+    for chunk in chunks:
+        by_document.setdefault(chunk['document'], []).append(chunk)
+
+    all_ids, all_vectors = [], []
+    for document_id, document_chunks in by_document.items():
+        path = _vectors_path(index_dir, document_id)
+        vectors = _read_vectors(path) if reuse and os.path.exists(path) else None
+
+        if vectors is None or len(vectors) != len(document_chunks):
+            vectors = staged.get(document_id, len(document_chunks)) if staged else None
+            if vectors is None:
+                vectors = _encode_document_chunks(document_chunks)
+            _write_vectors(path, vectors)
+
+        all_ids.extend(chunk['id'] for chunk in document_chunks)
+        all_vectors.append(vectors)
+    return np.asarray(all_ids, dtype='int64'), np.vstack(all_vectors)
+
+def _load_stored_vectors(index_dir, texts):
+    """
+    Loads the stored vectors of every document that still has chunks in the room.
+    """
+    all_ids, all_vectors = [], []
+    for document_id in sorted({chunk_document_id(chunk_id) for chunk_id in texts}):
+        vectors = _read_vectors(_vectors_path(index_dir, document_id))
+        all_ids.extend(make_chunk_id(document_id, position) for position in range(len(vectors)))
+        all_vectors.append(vectors)
+    return np.asarray(all_ids, dtype='int64'), np.vstack(all_vectors)
+
+def load_room_vectors(room):
+    """
+    Loads the stored chunk IDs and float32 vectors of a room, or empty arrays if it has no index.
+    """
+    index_dir = get_room_index_dir(room)
+    meta = _read_meta(index_dir)
+    if not _vectors_reusable(meta):
+        return np.empty(0, dtype='int64'), np.empty((0, 0), dtype='float32')
+    _, texts = _read_version(index_dir, meta)
+    return _load_stored_vectors(index_dir, texts)
+
+def get_vector_ref(room, document_id):
+    """
+    Returns the path, relative to INDEX_ROOT, of the matrix holding a document's chunk vectors.
+    """
+    return os.path.relpath(_vectors_path(get_room_index_dir(room), document_id), settings.INDEX_ROOT)
+
+def load_room_chunks(room):
+    """
+    Returns the stored chunks of a room ordered by document and position.
+    Chunks stored without their document are indexed under the legacy document.
+    """
+    from Chatmate.models import Chunk
+    rows = Chunk.objects.filter(room=get_room_name(room)).order_by('document_id', 'position')
+    return [
+        {'id': chunk_id, 'document': document_id or LEGACY_DOCUMENT_ID, 'text': text}
+        for chunk_id, document_id, text in rows.values_list('chunk_id', 'document_id', 'text').iterator()
+    ]
+
+def _link_vector_refs(room):
+    """
+    Points chunks without an embedding reference at the vector rows written for their documents.
+    """
+    from Chatmate.models import Chunk
+    unlinked = list(Chunk.objects.filter(room=get_room_name(room), vector_file='').only('id', 'document_id', 'position'))
+    for chunk in unlinked:
+        chunk.vector_file = get_vector_ref(room, chunk.document_id or LEGACY_DOCUMENT_ID)
+        chunk.vector_row = chunk.position
+    Chunk.objects.bulk_update(unlinked, ['vector_file', 'vector_row'], batch_size=500)
+
+def _build_locked(room, index_dir, progress=None):
+    chunks = load_room_chunks(room)
+
+    previous = _read_meta(index_dir)
+    if not _vectors_reusable(previous):
+        # Stored vectors of another model or layout cannot be reused
+        shutil.rmtree(os.path.join(index_dir, VECTORS_DIR_NAME), ignore_errors=True)
+    if not chunks:
+        _clear_room_index(index_dir)
+        return None
+
+    ids, vectors = _embed_document_chunks(index_dir, chunks, reuse=True)
+    _link_vector_refs(room)
+    if progress:
+        progress('embedded')
+    index = create_index(vectors, ids)
+    version = _write_version(index_dir, previous, index, {chunk['id']: chunk['text'] for chunk in chunks})
+    if progress:
+        progress('indexed')
+    return version
+
+def build_room_index(room):
+    """
+    Fully indexes the stored chunks of a room, reusing stored document vectors, and persists the result.
+    """
+    try:
+        with room_index_lock(room) as index_dir:
+            return _build_locked(room, index_dir)
+    except Exception as e:
+        raise RuntimeError(f"Error building room index: {str(e)}")
+
+def update_room_index(room, document_ids, chunks, progress=None, staged=None):
+    """
+    Removes the vectors of the given documents from the room index by ID and adds the new chunks.
+    Only the new chunks are embedded, unless their vectors were already staged; the rest of the index
+    is left as it is. The optional progress callback is called with 'embedded' and then 'indexed'.
+    """
+    try:
+        with room_index_lock(room) as index_dir:
+            meta = _read_meta(index_dir)
+            if not _is_current(meta):
+                return _build_locked(room, index_dir, progress=progress)
+
+            index, texts = _read_version(index_dir, meta)
+            document_ids = set(document_ids)
+
+            stale_ids = [chunk_id for chunk_id in texts if chunk_document_id(chunk_id) in document_ids]
+            for chunk_id in stale_ids:
+                del texts[chunk_id]
+
+            # Embedding first lets unchanged chunks reuse the vectors still stored for their document
+            if chunks:
+                ids, vectors = _embed_document_chunks(index_dir, chunks, staged=staged)
+                texts.update((chunk['id'], chunk['text']) for chunk in chunks)
+            for document_id in document_ids - {chunk['document'] for chunk in chunks}:
+                path = _vectors_path(index_dir, document_id)
+                if os.path.exists(path):
+                    os.remove(path)
+            _link_vector_refs(room)
+            if progress:
+                progress('embedded')
+
+            if not texts:
+                _clear_room_index(index_dir)
+                return None
+
+            # Indexes that cannot drop vectors keep them as tombstones until they make up
+            # INDEX_TOMBSTONE_MAX_RATIO of the live chunks
+            index_type = meta.get('index_type', 'flat')
+            tombstones = meta.get('tombstones', 0)
+            removable = index_type in REMOVABLE_INDEX_TYPES
+            if stale_ids and not removable:
+                tombstones += len(stale_ids)
+            too_many_tombstones = tombstones > settings.INDEX_TOMBSTONE_MAX_RATIO * len(texts)
+
+            # Quantizers and IVF centroids trained on the first few vectors of a room do not fit the
+            # vectors added later; indexes written before this was recorded count as untrained
+            trained = meta.get('trained', 0)
+            outgrown = (
+                needs_training(index_type, meta.get('compression', 'none'))
+                and len(texts) > settings.INDEX_RETRAIN_GROWTH * trained
+            )
+
+            # Rooms that outgrow their index type or training set, or hold too many tombstones,
+            # are rebuilt from the stored vectors without encoding anything again
+            if _layout_changed(meta, len(texts)) or too_many_tombstones or outgrown:
+                ids, vectors = _load_stored_vectors(index_dir, texts)
+                index = create_index(vectors, ids)
+                tombstones, trained = 0, None
+            else:
+                if stale_ids and removable:
+                    index.remove_ids(np.asarray(stale_ids, dtype='int64'))
+                elif stale_ids:
+                    tombstone_ids(index, stale_ids)
+                if chunks:
+                    index.add_with_ids(vectors, ids)
+            version = _write_version(index_dir, meta, index, texts, tombstones=tombstones, trained=trained)
+            if progress:
+                progress('indexed')
+            return version
+    except Exception as e:
+        raise RuntimeError(f"Error updating room index: {str(e)}")
+
+def _version_nbytes(index_dir, index, version, texts):
+    """
+    Approximates the heap memory held by a loaded index version from its file size and chunk texts.
+    Memory-mapped vectors live in the shared page cache and are not counted.
+    """
+    index_path, _ = _version_paths(index_dir, version)
+    text_bytes = sum(len(text) for text in texts.values())
+    if isinstance(index, MappedFlatIndex):
+        return text_bytes
+    return os.path.getsize(index_path) + text_bytes
+
+def load_room_index(room):
+    """
+    Loads the index and chunk texts of a room, building them first if missing.
+    The texts are keyed by the chunk IDs stored in the index. Loaded versions are
+    kept in the process-wide room index cache, so repeated queries skip the disk.
+    """
+    try:
+        room_name = get_room_name(room)
+        index_dir = get_room_index_dir(room)
+
+        # A concurrent writer may drop the version between reading meta and the files
+        for _ in range(2):
+            meta = _read_meta(index_dir)
+            if not _is_current(meta):
+                if build_room_index(room) is None:
+                    return None, {}
+                meta = _read_meta(index_dir)
+                if meta is None:
+                    return None, {}
+
+            cached = room_index_cache.get(room_name, _build_key(meta))
+            if cached is not None:
+                return cached
+
+            try:
+                index, texts = _read_version(index_dir, meta, mapped=settings.INDEX_MMAP)
+            except (FileNotFoundError, RuntimeError):
+                if all(os.path.exists(path) for path in _version_paths(index_dir, meta['version'])):
+                    raise
+                continue
+            if meta.get('tombstones'):
+                index = TombstonedIndex(index)
+            nbytes = _version_nbytes(index_dir, index, meta['version'], texts)
+            room_index_cache.put(room_name, _build_key(meta), (index, texts), nbytes)
+            return index, texts
+        raise FileNotFoundError(f"Index files for version {meta['version']} are missing")
+    except Exception as e:
+        raise RuntimeError(f"Error loading room index: {str(e)}")
+
+def delete_room_index(room):
+    """
+    Removes every persisted index file of a room.
+    """
+    room_index_cache.discard(get_room_name(room))
+    index_dir = get_room_index_dir(room)
+    if os.path.isdir(index_dir):
+        shutil.rmtree(index_dir, ignore_errors=True)
@@ -0,0 +1,113 @@
+import importlib.util
+from itertools import chain
+import openpyxl
+import pandas as pd
+from django.conf import settings
+
+from Chatmate.Utility.token_counting import count_tokens
+
+CELL_SEPARATOR = ' | '
+
+# Optional modules pandas needs to read these spreadsheet formats
+EXCEL_ENGINES = {'.xls': 'xlrd', '.ods': 'odf'}
+
+def _format_row(values):
+    return CELL_SEPARATOR.join('' if value is None else str(value).strip() for value in values)
+
+def iter_row_chunks(title, header, rows, page=None, max_tokens=None):
+    """
+    Groups whole rows into chunks of at most max_tokens tokens, each starting with the sheet title
+    and header row. Yields page dicts marked as already chunked. A row longer than a chunk is kept whole.
+    """
+    max_tokens = max_tokens or settings.CHUNK_MAX_TOKENS
+    tokenizer_name = settings.CHUNK_TOKENIZER
+    heading = "\n".join(line for line in (title, _format_row(header) if header else '') if line)
+    heading_tokens = count_tokens(heading, tokenizer_name) if heading else 0
+
+    def emit(lines):
+        return {'text': "\n".join([heading] + lines if heading else lines), 'page': page, 'chunked': True}
+
+    lines, tokens = [], heading_tokens
+    for row in rows:
+        line = _format_row(row)
+        if not line.replace(CELL_SEPARATOR, '').strip():
+            continue
+        line_tokens = count_tokens(line, tokenizer_name)
+        if lines and tokens + line_tokens > max_tokens:
+            yield emit(lines)
+            lines, tokens = [], heading_tokens
+        lines.append(line)
+        tokens += line_tokens
+    if lines:
+        yield emit(lines)
+
+def _frame_rows(frames):
+    for frame in frames:
+        yield from frame.itertuples(index=False, name=None)
+
+def _iter_frame_chunks(title, frames, page=None):
+    """
+    Yields row-aware chunks from a stream of DataFrames sharing the columns of the first one.
+    """
+    frames = iter(frames)
+    first = next(frames, None)
+    if first is None:
+        return
+    yield from iter_row_chunks(title, list(first.columns), _frame_rows(chain([first], frames)), page=page)
+
+def iter_delimited_chunks(file_path, delimiter):
+    """
+    Reads a delimited text file in row batches with pandas and yields row-aware chunks.
+    """
+    try:
+        with pd.read_csv(
+            file_path, sep=delimiter, dtype=str, keep_default_na=False, chunksize=settings.TABULAR_BATCH_ROWS,
+            encoding_errors='replace', on_bad_lines='skip',
+        ) as frames:
+            yield from _iter_frame_chunks('', frames)
+    except pd.errors.EmptyDataError:
+        return
+
+def iter_csv_chunks(file_path):
+    """
+    Yields row-aware chunks of a CSV file.
+    """
+    return iter_delimited_chunks(file_path, ',')
+
+def iter_tsv_chunks(file_path):
+    """
+    Yields row-aware chunks of a TSV file.
+    """
+    return iter_delimited_chunks(file_path, '\t')
+
+def iter_xlsx_chunks(file_path):
+    """
+    Streams the rows of each worksheet of an XLSX workbook in read-only mode and yields row-aware chunks.
+    The first non-empty row of a sheet is used as its header.
+    """
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for number, sheet in enumerate(workbook.worksheets, start=1):
+            rows = (row for row in sheet.iter_rows(values_only=True) if any(value is not None for value in row))
+            header = next(rows, None)
+            if header is not None:
+                yield from iter_row_chunks(f"Sheet: {sheet.title}", header, rows, page=number)
+    finally:
+        workbook.close()
+
+def has_excel_reader(extension):
+    """
+    Checks whether the optional engine pandas needs to read an XLS or ODS file is installed.
+    """
+    module = EXCEL_ENGINES.get(extension.lower())
+    return module is None or importlib.util.find_spec(module) is not None
+
+def iter_excel_chunks(file_path):
+    """
+    Yields row-aware chunks of each sheet of an XLS or ODS file read with pandas. These formats cannot
+    be streamed, so one sheet is held at a time. Requires the xlrd or odfpy engine, see has_excel_reader.
+    """
+    with pd.ExcelFile(file_path) as workbook:
+        for number, sheet_name in enumerate(workbook.sheet_names, start=1):
+            frame = workbook.parse(sheet_name, dtype=str, keep_default_na=False)
+            yield from _iter_frame_chunks(f"Sheet: {sheet_name}", [frame], page=number)
@@ -0,0 +1,44 @@
+import threading
+
+_tokenizers = {}
+_tokenizers_lock = threading.Lock()
+
+def get_tokenizer(name):
+    """
+    Returns the process-wide Hugging Face tokenizer with this name, or None if it cannot be loaded.
+    """
+    if name not in _tokenizers:
+        with _tokenizers_lock:
+            if name not in _tokenizers:
+                try:
+                    from transformers import AutoTokenizer
+                    _tokenizers[name] = AutoTokenizer.from_pretrained(name)
+                except Exception as e:
+                    print(f"Error loading tokenizer {name}, counting words instead: {str(e)}")
+                    _tokenizers[name] = None
+    return _tokenizers[name]
+
+def count_tokens(text, name):
+    """
+    Counts the tokens of a text, falling back to words when the tokenizer is unavailable.
+    """
+    tokenizer = get_tokenizer(name)
+    if tokenizer is None:
+        return len(text.split())
+    return len(tokenizer.encode(text, add_special_tokens=False))
+
+def split_by_tokens(text, max_tokens, name):
+    """
+    Yields consecutive slices of a text holding at most max_tokens tokens each.
+    """
+    tokenizer = get_tokenizer(name)
+    if tokenizer is None or not getattr(tokenizer, 'is_fast', False):
+        words = text.split()
+        for i in range(0, len(words), max_tokens):
+            yield ' '.join(words[i:i + max_tokens])
+        return
+
+    offsets = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)['offset_mapping']
+    for i in range(0, len(offsets), max_tokens):
+        window = offsets[i:i + max_tokens]
+        yield text[window[0][0]:window[-1][1]].strip()
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from Chatmate.Utility.indexing_documents import EMBEDDING_BACKENDS, REFERENCE_EMBEDDING_BACKEND, check_backend_parity
+from Chatmate.models import Chunk
+
+class Command(BaseCommand):
+    help = 'Reports how closely an embedding backend agrees with the reference backend on stored chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', choices=EMBEDDING_BACKENDS, help='Backend to check, defaults to EMBEDDING_BACKEND.')
+        parser.add_argument('--room', help='Sample chunks from this room only.')
+        parser.add_argument('--limit', type=int, default=200, help='Maximum number of chunks to encode.')
+
+    def handle(self, *args, **options):
+        chunks = Chunk.objects.exclude(text='')
+        if options['room']:
+            chunks = chunks.filter(room=options['room'])
+
+        texts = list(chunks.values_list('text', flat=True)[:options['limit']])
+        if not texts:
+            raise CommandError('No stored chunks found to sample.')
+
+        report = check_backend_parity(texts, options['backend'])
+        self.stdout.write(
+            f"{report['backend']} vs {REFERENCE_EMBEDDING_BACKEND} on {report['count']} chunks: "
+            f"mean cosine {report['mean_cosine']:.4f}, min cosine {report['min_cosine']:.4f}, "
+            f"{report['backend_seconds']:.2f}s vs {report['reference_seconds']:.2f}s"
+        )
@@ -0,0 +1,34 @@
+import os
+from urllib.parse import urlparse
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from Chatmate.Utility.embedding_service import UNIX_SCHEME, create_embedding_server
+from Chatmate.Utility.indexing_documents import preload_embedding_model
+
+class Command(BaseCommand):
+    help = 'Runs the local embedding service shared by all web workers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default=settings.EMBEDDING_SERVICE_URL, help='Address to listen on, defaults to EMBEDDING_SERVICE_URL.')
+
+    def handle(self, *args, **options):
+        url = options['url']
+        if not url:
+            raise CommandError('Set EMBEDDING_SERVICE_URL or pass --url.')
+
+        parsed = urlparse(url)
+        if parsed.scheme == UNIX_SCHEME and os.path.exists(parsed.path):
+            os.remove(parsed.path)
+
+        preload_embedding_model()
+        server = create_embedding_server(url)
+        self.stdout.write(self.style.SUCCESS(f'Embedding service listening on {url}'))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if parsed.scheme == UNIX_SCHEME and os.path.exists(parsed.path):
+                os.remove(parsed.path)
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from Chatmate.Utility.indexing_documents import COMPRESSIONS, evaluate_compression, select_index_type
+from Chatmate.Utility.room_index import load_room_vectors
+
+class Command(BaseCommand):
+    help = 'Reports memory saved and recall@k of each index compression on the stored vectors of a room.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('room', help='Name of the room to evaluate.')
+        parser.add_argument('--k', type=int, default=10, help='Number of neighbours compared against the exact index.')
+        parser.add_argument('--queries', type=int, default=200, help='Number of stored vectors used as queries.')
+
+    def handle(self, *args, **options):
+        _, vectors = load_room_vectors(options['room'])
+        if not len(vectors):
+            raise CommandError('The room has no stored vectors.')
+
+        index_type = select_index_type(len(vectors))
+        self.stdout.write(f"{len(vectors)} vectors, {index_type} index")
+        for compression in COMPRESSIONS:
+            try:
+                report = evaluate_compression(vectors, compression, options['k'], options['queries'], index_type)
+            except Exception as e:
+                self.stdout.write(f"{compression}: {str(e)}")
+                continue
+            self.stdout.write(
+                f"{compression}: {report['bytes']} bytes, saves {report['saved_bytes']} of {report['exact_bytes']}, "
+                f"recall@{report['k']} {report['recall_at_k']:.4f}"
+            )
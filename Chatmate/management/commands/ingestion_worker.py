@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from Chatmate.Utility.indexing_documents import preload_embedding_model
+from Chatmate.Utility.ingestion_jobs import run_worker
+
+class Command(BaseCommand):
+    help = 'Runs queued document ingestion jobs with bounded concurrency.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=settings.INGESTION_WORKERS, help='Jobs run at the same time, defaults to INGESTION_WORKERS.')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is drained.')
+
+    def handle(self, *args, **options):
+        if settings.EMBEDDING_PRELOAD:
+            # Loaded once here, job processes share it through fork
+            preload_embedding_model()
+        self.stdout.write(self.style.SUCCESS(f"Ingestion worker running {options['concurrency']} jobs at a time"))
+        try:
+            run_worker(concurrency=options['concurrency'], once=options['once'])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from Chatmate.Utility.ingestion_jobs import enqueue_ingestion
+from Chatmate.Utility.processing_documents import drop_legacy_chunks
+
+class Command(BaseCommand):
+    help = (
+        'Queues every document for indexing, then drops the chunks rooms stored without their document, '
+        'so each chunk belongs to a document and goes away with it.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--room', help='Only re-ingest the documents of this room.')
+
+    def handle(self, *args, **options):
+        from Chatmate.models import Documents, Rooms
+        rooms = Rooms.objects.all()
+        if options['room']:
+            rooms = rooms.filter(name=options['room'])
+
+        for room in rooms:
+            documents = list(Documents.objects.filter(room=room))
+            jobs = [enqueue_ingestion(document, room) for document in documents]
+            removed = drop_legacy_chunks(room)
+            if removed:
+                self.stdout.write(f"{room.name}: {removed} chunks without a document dropped")
+            self.stdout.write(f"{room.name}: {len(jobs)} documents queued")
+        self.stdout.write(self.style.SUCCESS('Re-ingestion queued'))
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Chatmate', '0002_query_embedding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='query',
+            name='prompt_tokens',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Chatmate', '0003_query_prompt_tokens'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rooms',
+            name='summary',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='rooms',
+            name='summary_turns',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Chatmate', '0004_rooms_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Chunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chunk_id', models.BigIntegerField()),
+                ('position', models.PositiveIntegerField()),
+                ('content_hash', models.CharField(db_index=True, max_length=64)),
+                ('text', models.TextField()),
+                ('vector_file', models.CharField(blank=True, default='', max_length=255)),
+                ('vector_row', models.PositiveIntegerField(blank=True, null=True)),
+                ('document', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='Chatmate.documents')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='Chatmate.rooms', to_field='name')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='chunk',
+            index=models.Index(fields=['room', 'document'], name='chunk_room_document_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='chunk',
+            constraint=models.UniqueConstraint(fields=('room', 'chunk_id'), name='unique_room_chunk_id'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:21
+
+import hashlib
+from django.db import migrations
+
+CHUNK_POSITION_BITS = 20
+LEGACY_CHUNK_WORDS = 100
+
+
+def _content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _legacy_chunks(text):
+    # Entries stored without IDs hold whole pages, split them the way they were originally chunked
+    words = text.split()
+    return [' '.join(words[i:i + LEGACY_CHUNK_WORDS]) for i in range(0, len(words), LEGACY_CHUNK_WORDS)]
+
+
+def split_combined_chunks(apps, schema_editor):
+    CombinedChunk = apps.get_model('Chatmate', 'CombinedChunk')
+    Documents = apps.get_model('Chatmate', 'Documents')
+    Chunk = apps.get_model('Chatmate', 'Chunk')
+    position_mask = (1 << CHUNK_POSITION_BITS) - 1
+
+    for combined_chunk in CombinedChunk.objects.iterator():
+        room_name = combined_chunk.room_id
+        document_ids = set(Documents.objects.filter(room_id=room_name).values_list('id', flat=True))
+        rows, seen, legacy_position = [], set(), 0
+        for stored in combined_chunk.chunks:
+            text = stored.get('text', '')
+            if 'id' in stored and stored.get('document') in document_ids:
+                if stored['id'] in seen:
+                    continue
+                seen.add(stored['id'])
+                rows.append(Chunk(
+                    room_id=room_name, document_id=stored['document'], chunk_id=stored['id'],
+                    position=stored['id'] & position_mask, content_hash=_content_hash(text), text=text,
+                ))
+                continue
+            for legacy_text in _legacy_chunks(text):
+                # Legacy chunks belong to document 0, whose chunk IDs equal their positions
+                rows.append(Chunk(
+                    room_id=room_name, document_id=None, chunk_id=legacy_position,
+                    position=legacy_position, content_hash=_content_hash(legacy_text), text=legacy_text,
+                ))
+                legacy_position += 1
+        Chunk.objects.bulk_create(rows, batch_size=500)
+
+
+def join_chunks(apps, schema_editor):
+    CombinedChunk = apps.get_model('Chatmate', 'CombinedChunk')
+    Chunk = apps.get_model('Chatmate', 'Chunk')
+
+    chunks_by_room = {}
+    for chunk in Chunk.objects.order_by('room_id', 'chunk_id').iterator():
+        chunks_by_room.setdefault(chunk.room_id, []).append(
+            {'id': chunk.chunk_id, 'document': chunk.document_id or 0, 'text': chunk.text}
+        )
+    for room_name, chunks in chunks_by_room.items():
+        CombinedChunk.objects.update_or_create(room_id=room_name, defaults={'chunks': chunks})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Chatmate', '0005_chunk'),
+    ]
+
+    operations = [
+        migrations.RunPython(split_combined_chunks, join_chunks),
+    ]
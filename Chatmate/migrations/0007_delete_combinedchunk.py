@@ -0,0 +1,16 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:21
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Chatmate', '0006_migrate_combined_chunks'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='CombinedChunk',
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:05
+
+import hashlib
+from django.db import migrations, models
+
+
+def hash_existing_files(apps, schema_editor):
+    Documents = apps.get_model('Chatmate', 'Documents')
+    for document in Documents.objects.exclude(file='').exclude(file__isnull=True).iterator():
+        try:
+            digest = hashlib.sha256()
+            with document.file.open('rb') as f:
+                for block in f.chunks():
+                    digest.update(block)
+        except Exception as e:
+            print(f"Error hashing document {document.id}: {str(e)}")
+            continue
+        Documents.objects.filter(id=document.id).update(content_hash=digest.hexdigest())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Chatmate', '0007_delete_combinedchunk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documents',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=64),
+        ),
+        migrations.RunPython(hash_existing_files, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Chatmate', '0009_ingestionjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chunk',
+            name='page_start',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chunk',
+            name='page_end',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
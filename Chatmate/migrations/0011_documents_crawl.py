@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Chatmate', '0010_chunk_pages'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documents',
+            name='crawl',
+            field=models.BooleanField(default=False),
+        ),
+    ]
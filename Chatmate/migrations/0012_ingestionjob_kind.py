@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Chatmate', '0011_documents_crawl'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestionjob',
+            name='kind',
+            field=models.CharField(choices=[('index', 'Index'), ('delete', 'Delete')], default='index', max_length=16),
+        ),
+    ]
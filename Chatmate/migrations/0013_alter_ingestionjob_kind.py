@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Chatmate', '0012_ingestionjob_kind'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ingestionjob',
+            name='kind',
+            field=models.CharField(choices=[('index', 'Index'), ('delete', 'Delete'), ('move', 'Move')], default='index', max_length=16),
+        ),
+    ]
@@ -1,6 +1,7 @@
+import numpy as np
 from django.db import models
 from Auth.models import User
-from Chatmate.Utility.general_utility import generate_random_id
+from Chatmate.Utility.general_utility import file_content_hash, generate_random_id
 
 class Rooms(models.Model):
     id = models.CharField(max_length=255, primary_key=True, default=generate_random_id, editable=False)
@@ -8,6 +9,8 @@ class Rooms(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, to_field='id', related_name='Users')
+    summary = models.TextField(blank=True, default='')
+    summary_turns = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.name
@@ -16,8 +19,19 @@ class Documents(models.Model):
     title = models.CharField(max_length=255)
     file = models.FileField(upload_to='documents/', null=True, blank=True)
     link = models.URLField(null=True, blank=True)
+    # Crawl the site of the link, or the pages of a sitemap link, instead of fetching the single page
+    crawl = models.BooleanField(default=False)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     room = models.ForeignKey(Rooms, on_delete=models.CASCADE, to_field='name', related_name='documents')
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        # Hash newly uploaded files so identical uploads can reuse each other's chunks
+        if self.file and not self.file._committed:
+            self.content_hash = file_content_hash(self.file)
+        elif not self.file:
+            self.content_hash = ''
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.title
@@ -27,19 +41,100 @@ class Query(models.Model):
     response_text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     room = models.ForeignKey(Rooms, on_delete=models.CASCADE, to_field='name', related_name='queries')
+    embedding = models.BinaryField(null=True, blank=True, editable=False)
+    embedding_model = models.CharField(max_length=255, null=True, blank=True, editable=False)
+    prompt_tokens = models.PositiveIntegerField(null=True, blank=True)
+
+    def history_text(self):
+        return f"{self.query_text}\n{self.response_text}"
+
+    def embed(self):
+        """
+        Stores the float32 embedding of this query and response pair.
+        """
+        from Chatmate.Utility.indexing_documents import embedding_model_id, encode_texts
+        self.embedding = np.asarray(encode_texts([self.history_text()]), dtype='float32')[0].tobytes()
+        self.embedding_model = embedding_model_id()
+
+    def get_embedding(self):
+        """
+        Returns the stored embedding, computing and persisting it first if it is missing,
+        or stale because it was made by another model or backend.
+        """
+        from Chatmate.Utility.indexing_documents import embedding_model_id
+        if self.embedding is None or self.embedding_model != embedding_model_id():
+            self.embed()
+            Query.objects.filter(pk=self.pk).update(embedding=self.embedding, embedding_model=self.embedding_model)
+        return np.frombuffer(self.embedding, dtype='float32')
 
     def save(self, *args, **kwargs):
         if not Query.objects.filter(query_text=self.query_text).exists():
+            if self.embedding is None:
+                try:
+                    self.embed()
+                except Exception as e:
+                    print(f"Error embedding query: {str(e)}")
             super().save(*args, **kwargs)
 
     def __str__(self):
         return self.query_text
 
-class CombinedChunk(models.Model):
-    chunks = models.JSONField(default=list)  
+class Chunk(models.Model):
+    room = models.ForeignKey(Rooms, on_delete=models.CASCADE, to_field='name', related_name='chunks')
+    # Null for chunks migrated from entries that were stored without their document
+    document = models.ForeignKey(Documents, on_delete=models.CASCADE, null=True, blank=True, related_name='chunks')
+    chunk_id = models.BigIntegerField()
+    position = models.PositiveIntegerField()
+    content_hash = models.CharField(max_length=64, db_index=True)
+    text = models.TextField()
+    # Pages of the source file the chunk was read from, when the parser reports pages
+    page_start = models.PositiveIntegerField(null=True, blank=True)
+    page_end = models.PositiveIntegerField(null=True, blank=True)
+    # Vector matrix under INDEX_ROOT holding this chunk's embedding, and its row in that matrix
+    vector_file = models.CharField(max_length=255, blank=True, default='')
+    vector_row = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=('room', 'chunk_id'), name='unique_room_chunk_id'),
+        ]
+        indexes = [
+            models.Index(fields=('room', 'document'), name='chunk_room_document_idx'),
+        ]
+
+    def __str__(self):
+        return str(self.chunk_id)
+
+
+class IngestionJob(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (SUCCEEDED, 'Succeeded'), (FAILED, 'Failed')]
+
+    # Stages are reported in this order while a job runs
+    STAGES = ('queued', 'parsed', 'chunked', 'embedded', 'indexed')
+    STAGE_CHOICES = [(stage, stage.capitalize()) for stage in STAGES]
+
+    # Delete jobs drop the document's chunks and index entries, then the document itself;
+    # move jobs carry its stored chunks over to the job's room without parsing it again
+    INDEX = 'index'
+    DELETE = 'delete'
+    MOVE = 'move'
+    KIND_CHOICES = [(INDEX, 'Index'), (DELETE, 'Delete'), (MOVE, 'Move')]
+
+    document = models.ForeignKey(Documents, on_delete=models.CASCADE, related_name='ingestion_jobs')
+    room = models.ForeignKey(Rooms, on_delete=models.CASCADE, to_field='name', related_name='ingestion_jobs')
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES, default=INDEX)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    stage = models.CharField(max_length=16, choices=STAGE_CHOICES, default='queued')
+    error = models.TextField(blank=True, default='')
+    attempts = models.PositiveIntegerField(default=0)
+    timeout_seconds = models.PositiveIntegerField()
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
-    room = models.ForeignKey(Rooms, on_delete=models.CASCADE, to_field='name', related_name='combined_chunks')
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
-        return str(self.id)
\ No newline at end of file
+        return f"{self.document_id} {self.status}"
\ No newline at end of file
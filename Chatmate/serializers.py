@@ -9,11 +9,11 @@ class DocumentSerializer(serializers.ModelSerializer):
 class QuerySerializer(serializers.ModelSerializer):
     class Meta:
         model = models.Query
-        fields = '__all__'
+        exclude = ('embedding', 'embedding_model')
 
-class CombinedChunkSerializer(serializers.ModelSerializer):
+class IngestionJobSerializer(serializers.ModelSerializer):
     class Meta:
-        model = models.CombinedChunk
+        model = models.IngestionJob
         fields = '__all__'
 
 class RoomsSerializer(serializers.ModelSerializer):
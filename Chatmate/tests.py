@@ -1,3 +1,23 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
 
-# Create your tests here.
+from Chatmate.Utility.indexing_documents import MAX_PENDING_CHARS, iter_tagged_sentences
+
+class IterTaggedSentencesTests(SimpleTestCase):
+    def test_boundary_free_blocks_are_cut_to_bounded_sentences(self):
+        block = ('x' * 99 + ' ') * 655
+        blocks = [(block, number) for number in range(1, 61)]
+
+        sentences = list(iter_tagged_sentences(blocks))
+
+        self.assertTrue(all(len(sentence) <= MAX_PENDING_CHARS for sentence, _ in sentences))
+        self.assertEqual(
+            sum(len(sentence.replace(' ', '')) for sentence, _ in sentences),
+            sum(len(text.replace(' ', '')) for text, _ in blocks),
+        )
+        # Sentences are emitted while blocks stream in, not held back until the end
+        self.assertGreater(len([tag for _, tag in sentences if tag == 1]), 1)
+
+    def test_text_without_spaces_is_cut_at_the_limit(self):
+        sentences = list(iter_tagged_sentences([('y' * (MAX_PENDING_CHARS * 3 + 5), 1)]))
+
+        self.assertEqual([len(sentence) for sentence, _ in sentences], [MAX_PENDING_CHARS] * 3 + [5])
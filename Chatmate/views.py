@@ -1,9 +1,11 @@
 from Auth.models import User
 from Auth.utils import check_auth, create_response, jwt_decode_handler
-from Chatmate.Utility.processing_documents import update_combined_chunks
+from Chatmate.Utility.conversation_summary import schedule_summary_update
+from Chatmate.Utility.ingestion_jobs import enqueue_ingestion, latest_ingestion_job, pending_deletion_ids
 from Chatmate.Utility.processing_query import process_query
-from Chatmate.models import Documents, Query, Rooms
-from Chatmate.serializers import DocumentSerializer, QuerySerializer, RoomsSerializer
+from Chatmate.Utility.room_index import delete_room_index
+from Chatmate.models import Documents, IngestionJob, Query, Rooms
+from Chatmate.serializers import DocumentSerializer, IngestionJobSerializer, QuerySerializer, RoomsSerializer
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.parsers import MultiPartParser, FormParser
@@ -11,6 +13,14 @@ from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from django.core.exceptions import ObjectDoesNotExist
 
+def parse_bool(value):
+    """
+    Reads a form boolean, returning None when the value was not sent.
+    """
+    if value is None or value == '':
+        return None
+    return str(value).lower() in ('true', '1', 'yes', 'on')
+
 class AuthenticatedModelViewSet(viewsets.GenericViewSet):
     permission_classes = [IsAuthenticated]
 
@@ -21,25 +31,39 @@ class DocumentViewSet(AuthenticatedModelViewSet):
     serializer_class = DocumentSerializer
     parser_classes = [MultiPartParser, FormParser]
 
-    def handle_document_update(self, document, room, file=None, title=None, link=None):
+    def handle_document_update(self, document, room, file=None, title=None, link=None, crawl=None):
         """
         Helper method to handle document updates based on provided data.
+        Returns the ingestion job queued for the document, or None if it needs no reindexing.
         """
+        previous_room = document.room
+        room_changed = bool(room) and room.name != previous_room.name
+        link_changed = bool(link) and link != document.link
+        if crawl is not None and crawl != document.crawl:
+            document.crawl = crawl
+            link_changed = link_changed or bool(document.link)
+
         if title:
             document.title = title
         if file:
             if document.file:
                 document.file.delete()
             document.file = file
-            update_combined_chunks(document_ids=[document.id], room=room)
         if link:
             document.link = link
-            update_combined_chunks(document_ids=[document.id], room=room)
         if room:
             document.room = room
-            update_combined_chunks(document_ids=[document.id], room=room)
         document.save()
 
+        # Title and room changes never reparse; a new file or link is reindexed once, after saving.
+        # Both room indexes change when the room does, so moves run as jobs too, and a reindexing
+        # job drops the chunks left in the previous room itself
+        if not (file or link_changed):
+            if room_changed:
+                return enqueue_ingestion(document, document.room, kind=IngestionJob.MOVE)
+            return None
+        return enqueue_ingestion(document, document.room)
+
     @action(detail=False, methods=['post'])
     def upload_file(self, request):
         """
@@ -49,6 +73,7 @@ class DocumentViewSet(AuthenticatedModelViewSet):
             file = request.data.get('file')
             title = request.data.get('title')
             link = request.data.get('link')
+            crawl = parse_bool(request.data.get('crawl'))
             room_name = request.data.get('room')
 
             room = Rooms.objects.get(name=room_name)
@@ -57,14 +82,14 @@ class DocumentViewSet(AuthenticatedModelViewSet):
             if not check_auth(room, auth_header):
                 return check_auth(room, auth_header)
 
-            document = Documents.objects.create(file=file, title=title, link=link, room=room)
-            update_combined_chunks(document_ids=[document.id], room=room)
+            document = Documents.objects.create(file=file, title=title, link=link, crawl=bool(crawl), room=room)
+            job = enqueue_ingestion(document, room)
 
             return create_response(
                 success=True, 
-                message='Document uploaded successfully', 
-                body=DocumentSerializer(document).data, 
-                status_code=status.HTTP_201_CREATED
+                message='Document uploaded, ingestion queued', 
+                body={**DocumentSerializer(document).data, 'job_id': job.id}, 
+                status_code=status.HTTP_202_ACCEPTED
             )
         except ObjectDoesNotExist:
             return create_response(
@@ -93,14 +118,22 @@ class DocumentViewSet(AuthenticatedModelViewSet):
             if not check_auth(room, auth_header):
                 return check_auth(room, auth_header)
 
-            self.handle_document_update(
+            job = self.handle_document_update(
                 document, 
                 room, 
                 file=request.data.get('file'), 
                 title=request.data.get('title'), 
-                link=request.data.get('link')
+                link=request.data.get('link'),
+                crawl=parse_bool(request.data.get('crawl'))
             )
 
+            if job:
+                return create_response(
+                    success=True, 
+                    message='Document updated, ingestion queued', 
+                    body={**DocumentSerializer(document).data, 'job_id': job.id}, 
+                    status_code=status.HTTP_202_ACCEPTED
+                )
             return create_response(
                 success=True, 
                 message='Document updated successfully', 
@@ -133,15 +166,22 @@ class DocumentViewSet(AuthenticatedModelViewSet):
             if not check_auth(room, auth_header):
                 return check_auth(room, auth_header)
 
-            update_combined_chunks(document_ids=[document.id], delete=True)
-            if document.file:
-                document.file.delete()
-            document.delete()
+            # Removing a document's vectors can rebuild the room index, so it runs as a job
+            job = enqueue_ingestion(document, room, kind=IngestionJob.DELETE)
+            if job.status == IngestionJob.FAILED:
+                raise RuntimeError(job.error)
+            if job.status == IngestionJob.SUCCEEDED:
+                return create_response(
+                    success=True, 
+                    message='Document deleted successfully', 
+                    status_code=status.HTTP_200_OK
+                )
 
             return create_response(
                 success=True, 
-                message='Document deleted successfully', 
-                status_code=status.HTTP_200_OK
+                message='Document deletion queued', 
+                body={'job_id': job.id}, 
+                status_code=status.HTTP_202_ACCEPTED
             )
         except ObjectDoesNotExist:
             return create_response(
@@ -156,6 +196,45 @@ class DocumentViewSet(AuthenticatedModelViewSet):
                 status_code=status.HTTP_400_BAD_REQUEST
             )
 
+    @action(detail=True, methods=['get'])
+    def ingestion_status(self, request, pk=None):
+        """
+        Report the progress of the latest ingestion job of the document with the provided ID.
+        """
+        try:
+            document = Documents.objects.get(id=pk)
+
+            auth_header = request.headers.get('Authorization')
+            if not check_auth(document.room, auth_header):
+                return check_auth(document.room, auth_header)
+
+            job = latest_ingestion_job(document)
+            if job is None:
+                return create_response(
+                    success=False, 
+                    message='No ingestion job found for this document', 
+                    status_code=status.HTTP_404_NOT_FOUND
+                )
+
+            return create_response(
+                success=True, 
+                message='Ingestion status retrieved successfully', 
+                body=IngestionJobSerializer(job).data, 
+                status_code=status.HTTP_200_OK
+            )
+        except ObjectDoesNotExist:
+            return create_response(
+                success=False, 
+                message='Document not found', 
+                status_code=status.HTTP_404_NOT_FOUND
+            )
+        except Exception as e:
+            return create_response(
+                success=False, 
+                message=f'Error retrieving ingestion status: {str(e)}', 
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+
     @action(detail=True, methods=['get'])
     def get_documents(self, request, pk=None):
         """
@@ -168,7 +247,7 @@ class DocumentViewSet(AuthenticatedModelViewSet):
             if not check_auth(room, auth_header):
                 return check_auth(room, auth_header)
 
-            documents = Documents.objects.filter(room=room)
+            documents = Documents.objects.filter(room=room).exclude(id__in=pending_deletion_ids())
             if not documents.exists():
                 raise ValidationError('No documents found for this room')
 
@@ -212,8 +291,14 @@ class QueryViewSet(AuthenticatedModelViewSet):
             if not check_auth(room, auth_header):
                 return check_auth(room, auth_header)
 
-            response_text = process_query(query_text, room_name)
-            query = Query.objects.create(query_text=query_text, response_text=response_text, room=room)
+            response_text, prompt_tokens = process_query(query_text, room_name)
+            query = Query.objects.create(
+                query_text=query_text,
+                response_text=response_text,
+                prompt_tokens=prompt_tokens,
+                room=room
+            )
+            schedule_summary_update(room)
 
             return create_response(
                 success=True, 
@@ -249,7 +334,8 @@ class QueryViewSet(AuthenticatedModelViewSet):
                 return check_auth(room, auth_header)
 
             query.query_text = request.data.get('query')
-            query.response_text = process_query(query.query_text, room_name)
+            query.response_text, query.prompt_tokens = process_query(query.query_text, room_name)
+            query.embedding = None
             query.save()
 
             return create_response(
@@ -355,6 +441,7 @@ class RoomsViewSet(AuthenticatedModelViewSet):
 
             Documents.objects.filter(room=room).delete()
             Query.objects.filter(room=room).delete()
+            delete_room_index(room)
             room.delete()
 
             return create_response(
@@ -112,6 +112,122 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Retrieval settings
+EMBEDDING_PRELOAD = os.getenv('EMBEDDING_PRELOAD') == 'True'
+
+# One of torch, onnx or onnx-int8
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch')
+EMBEDDING_ONNX_INT8_FILE = os.getenv('EMBEDDING_ONNX_INT8_FILE', 'onnx/model_quint8_avx2.onnx')
+
+# Optional shared embedding service, e.g. http://127.0.0.1:8765 or unix:///tmp/paai-embedding.sock
+EMBEDDING_SERVICE_URL = os.getenv('EMBEDDING_SERVICE_URL')
+EMBEDDING_SERVICE_TIMEOUT = float(os.getenv('EMBEDDING_SERVICE_TIMEOUT', 10))
+EMBEDDING_SERVICE_RETRY_SECONDS = float(os.getenv('EMBEDDING_SERVICE_RETRY_SECONDS', 30))
+# Bulk encodes are sent in requests of at most EMBEDDING_SERVICE_MAX_BATCH texts, each allowed the bulk timeout
+EMBEDDING_SERVICE_MAX_BATCH = int(os.getenv('EMBEDDING_SERVICE_MAX_BATCH', 128))
+EMBEDDING_SERVICE_BULK_TIMEOUT = float(os.getenv('EMBEDDING_SERVICE_BULK_TIMEOUT', 60))
+
+# Concurrent query embeddings are encoded together, waiting at most this long for a batch to fill
+EMBEDDING_BATCH_ENABLED = os.getenv('EMBEDDING_BATCH_ENABLED', 'True') == 'True'
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv('EMBEDDING_BATCH_MAX_SIZE', 32))
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv('EMBEDDING_BATCH_MAX_WAIT_MS', 5))
+# Each process logs its batcher stats at most this often while it encodes (0 to disable)
+EMBEDDING_BATCH_LOG_SECONDS = float(os.getenv('EMBEDDING_BATCH_LOG_SECONDS', 300))
+INDEX_ROOT = os.getenv('INDEX_ROOT', os.path.join(BASE_DIR, 'data', 'indexes'))
+INDEX_CACHE_MAX_BYTES = int(os.getenv('INDEX_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+# Documents are chunked on sentence boundaries into chunks of at most CHUNK_MAX_TOKENS embedding tokens
+CHUNK_TOKENIZER = os.getenv('CHUNK_TOKENIZER', 'sentence-transformers/all-MiniLM-L6-v2')
+CHUNK_MAX_TOKENS = int(os.getenv('CHUNK_MAX_TOKENS', 200))
+CHUNK_OVERLAP_TOKENS = int(os.getenv('CHUNK_OVERLAP_TOKENS', 32))
+
+# PDFs of at least PDF_PARALLEL_MIN_PAGES pages are extracted in page ranges across PDF_WORKERS processes (0 for one per core)
+PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', 50))
+PDF_PAGES_PER_SHARD = int(os.getenv('PDF_PAGES_PER_SHARD', 25))
+PDF_WORKERS = int(os.getenv('PDF_WORKERS', 0))
+
+# Parsed file text is cached on disk by content hash, compressed, within PARSE_CACHE_MAX_BYTES
+PARSE_CACHE_ENABLED = os.getenv('PARSE_CACHE_ENABLED', 'True') == 'True'
+PARSE_CACHE_ROOT = os.getenv('PARSE_CACHE_ROOT', os.path.join(BASE_DIR, 'data', 'parse_cache'))
+PARSE_CACHE_MAX_BYTES = int(os.getenv('PARSE_CACHE_MAX_BYTES', 1024 * 1024 * 1024))
+
+# Links are fetched through one pooled session and cached on disk, revalidated with ETag/Last-Modified
+LINK_CACHE_ROOT = os.getenv('LINK_CACHE_ROOT', os.path.join(BASE_DIR, 'data', 'link_cache'))
+LINK_POOL_SIZE = int(os.getenv('LINK_POOL_SIZE', 10))
+LINK_CONNECT_TIMEOUT = float(os.getenv('LINK_CONNECT_TIMEOUT', 5))
+LINK_READ_TIMEOUT = float(os.getenv('LINK_READ_TIMEOUT', 30))
+LINK_USER_AGENT = os.getenv('LINK_USER_AGENT', 'paAI-link-fetcher/1.0')
+
+# Crawled links fetch up to CRAWL_MAX_PAGES same-site pages, CRAWL_MAX_DEPTH links away from the seed
+CRAWL_MAX_PAGES = int(os.getenv('CRAWL_MAX_PAGES', 200))
+CRAWL_MAX_DEPTH = int(os.getenv('CRAWL_MAX_DEPTH', 3))
+CRAWL_CONCURRENCY = int(os.getenv('CRAWL_CONCURRENCY', 16))
+CRAWL_PER_HOST_CONCURRENCY = int(os.getenv('CRAWL_PER_HOST_CONCURRENCY', 8))
+CRAWL_TIMEOUT = float(os.getenv('CRAWL_TIMEOUT', 15))
+CRAWL_RESPECT_ROBOTS = os.getenv('CRAWL_RESPECT_ROBOTS', 'True') == 'True'
+CRAWL_USER_AGENT = os.getenv('CRAWL_USER_AGENT', 'paAI-crawler/1.0')
+
+# Spreadsheets and CSV files are read this many rows at a time and chunked on whole rows under their header
+TABULAR_BATCH_ROWS = int(os.getenv('TABULAR_BATCH_ROWS', 1000))
+
+# Rooms switch from exact search to HNSW, then to IVF, as their chunk count grows
+INDEX_HNSW_MIN_CHUNKS = int(os.getenv('INDEX_HNSW_MIN_CHUNKS', 5000))
+INDEX_IVF_MIN_CHUNKS = int(os.getenv('INDEX_IVF_MIN_CHUNKS', 50000))
+INDEX_HNSW_M = int(os.getenv('INDEX_HNSW_M', 32))
+INDEX_HNSW_EF_CONSTRUCTION = int(os.getenv('INDEX_HNSW_EF_CONSTRUCTION', 80))
+INDEX_HNSW_EF_SEARCH = int(os.getenv('INDEX_HNSW_EF_SEARCH', 64))
+# HNSW keeps removed vectors as filtered tombstones, rebuilding once they exceed this share of the live chunks
+INDEX_TOMBSTONE_MAX_RATIO = float(os.getenv('INDEX_TOMBSTONE_MAX_RATIO', 0.2))
+INDEX_IVF_NPROBE = int(os.getenv('INDEX_IVF_NPROBE', 16))
+
+# Index compression is one of none, float16, sq8 or pq; stored vectors may be kept as float16
+INDEX_COMPRESSION = os.getenv('INDEX_COMPRESSION', 'none')
+INDEX_PQ_M = int(os.getenv('INDEX_PQ_M', 48))
+INDEX_PQ_NBITS = int(os.getenv('INDEX_PQ_NBITS', 8))
+INDEX_PQ_MIN_CHUNKS = int(os.getenv('INDEX_PQ_MIN_CHUNKS', 10000))
+# Trained indexes (sq8, pq, IVF) are retrained from the stored vectors once a room grows past this
+# multiple of the vectors they were trained on
+INDEX_RETRAIN_GROWTH = float(os.getenv('INDEX_RETRAIN_GROWTH', 2))
+VECTOR_STORAGE_DTYPE = os.getenv('VECTOR_STORAGE_DTYPE', 'float32')
+
+# Chat history retrieval searches the stored embeddings of the latest HISTORY_WINDOW turns (0 for all)
+HISTORY_WINDOW = int(os.getenv('HISTORY_WINDOW', 50))
+HISTORY_TOP_K = int(os.getenv('HISTORY_TOP_K', 5))
+
+# Turns older than the last SUMMARY_RECENT_TURNS are folded into a room summary every SUMMARY_EVERY_TURNS turns
+SUMMARY_ENABLED = os.getenv('SUMMARY_ENABLED', 'True') == 'True'
+SUMMARY_EVERY_TURNS = int(os.getenv('SUMMARY_EVERY_TURNS', 10))
+SUMMARY_RECENT_TURNS = int(os.getenv('SUMMARY_RECENT_TURNS', 4))
+
+# Prompts are filled by relevance up to PROMPT_TOKEN_BUDGET tokens; chunks farther than
+# PROMPT_MAX_DISTANCE (squared L2, 0 to disable) or overlapping a chosen chunk are dropped
+PROMPT_TOKENIZER = os.getenv('PROMPT_TOKENIZER', 'sentence-transformers/all-MiniLM-L6-v2')
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', 3000))
+PROMPT_MAX_DISTANCE = float(os.getenv('PROMPT_MAX_DISTANCE', 1.2))
+PROMPT_DUPLICATE_THRESHOLD = float(os.getenv('PROMPT_DUPLICATE_THRESHOLD', 0.9))
+# Chat history may take at most this share of the prompt budget, leaving the rest for context
+PROMPT_HISTORY_SHARE = float(os.getenv('PROMPT_HISTORY_SHARE', 0.5))
+PROMPT_CONTEXT_CANDIDATES = int(os.getenv('PROMPT_CONTEXT_CANDIDATES', 10))
+
+# Uploads are indexed in the request unless INGESTION_ASYNC=True, which hands them to the ingestion_worker
+# command; only enable it where that worker runs, or queued jobs are never picked up
+INGESTION_ASYNC = os.getenv('INGESTION_ASYNC', 'False') == 'True'
+INGESTION_WORKERS = int(os.getenv('INGESTION_WORKERS', 2))
+INGESTION_JOB_TIMEOUT = int(os.getenv('INGESTION_JOB_TIMEOUT', 900))
+INGESTION_MAX_ATTEMPTS = int(os.getenv('INGESTION_MAX_ATTEMPTS', 3))
+INGESTION_POLL_SECONDS = float(os.getenv('INGESTION_POLL_SECONDS', 1))
+# Chunks are embedded in batches of this many while their document is still being parsed or crawled
+INGESTION_EMBED_BATCH = int(os.getenv('INGESTION_EMBED_BATCH', 256))
+
+# LLM providers share one keep-alive client per process with these timeouts and connection pool size
+LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', 5))
+LLM_READ_TIMEOUT = float(os.getenv('LLM_READ_TIMEOUT', 60))
+LLM_POOL_SIZE = int(os.getenv('LLM_POOL_SIZE', 20))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 2))
+
+# Open room indexes read-only through memory maps so workers share one page-cache copy
+INDEX_MMAP = os.getenv('INDEX_MMAP', 'True') == 'True'
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
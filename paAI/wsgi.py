@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'paAI.settings')
 
 application = get_wsgi_application()
+
+# With `gunicorn --preload` this runs once in the master, so forked workers share the model
+from django.conf import settings
+
+if settings.EMBEDDING_PRELOAD:
+    from Chatmate.Utility.indexing_documents import preload_embedding_model
+    preload_embedding_model()